@@ -0,0 +1,90 @@
+"""
+Benchmark: one-hot vs native categorical encoding for the price models.
+
+Fits the global model's feature set (year, mileage, make, model, fuelType,
+transmission) with both pipelines from price_features on the same
+train/test split and prints fit time, predict latency (whole test set and
+single rows), pickled model size and MAE.
+
+Usage (from src/algos/LightGBM_files):
+    python bench_encoding.py
+    python bench_encoding.py --makes BMW Audi --rows 50000 --single 200
+"""
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_absolute_error
+
+from listing_data import load_listings
+from price_features import ENCODINGS, build_pipeline, fit_params
+
+COLUMNS = ["make", "model", "year", "mileage", "price", "fuelType", "transmission"]
+NUM_FEATURES = ["year", "mileage"]
+CAT_FEATURES = ["make", "model", "fuelType", "transmission"]
+
+
+def prepare(df):
+    # Same cleaning as models/lightGBM_algo.py
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df = df[df["price"].notnull() & (df["price"] > 1000) & (df["make"] != '')].copy()
+    df[NUM_FEATURES] = df[NUM_FEATURES].fillna(df[NUM_FEATURES].median())
+    df[CAT_FEATURES] = df[CAT_FEATURES].fillna("unknown")
+    return df[NUM_FEATURES + CAT_FEATURES], np.log1p(df["price"])
+
+
+def bench(encoding, X_train, X_test, y_train, y_test, single):
+    pipe = build_pipeline(NUM_FEATURES, CAT_FEATURES, encoding=encoding)
+
+    start = time.perf_counter()
+    pipe.fit(X_train, y_train, **fit_params(CAT_FEATURES, encoding))
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = pipe.predict(X_test)
+    batch_s = time.perf_counter() - start
+
+    latencies = []
+    for i in range(min(single, len(X_test))):
+        row = X_test.iloc[i:i + 1]
+        start = time.perf_counter()
+        pipe.predict(row)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "fit_s": fit_s,
+        "batch_rows_per_s": len(X_test) / batch_s,
+        "single_p50_ms": np.percentile(latencies, 50) * 1000 if latencies else float("nan"),
+        "single_p99_ms": np.percentile(latencies, 99) * 1000 if latencies else float("nan"),
+        "size_mb": len(pickle.dumps(pipe)) / 1e6,
+        "mae": mean_absolute_error(np.expm1(y_test), np.expm1(y_pred)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one-hot and native categorical LightGBM pipelines")
+    parser.add_argument("--makes", nargs="+", help="only these makes (default: all)")
+    parser.add_argument("--rows", type=int, help="sample this many rows first")
+    parser.add_argument("--single", type=int, default=100, help="single-row predictions to time")
+    args = parser.parse_args()
+
+    df = load_listings(COLUMNS, makes=args.makes)
+    if args.rows and len(df) > args.rows:
+        df = df.sample(args.rows, random_state=42)
+    X, y = prepare(df)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    print(f"{len(X_train)} train / {len(X_test)} test rows, {X['model'].nunique()} distinct models\n")
+
+    print(f"{'encoding':<8} {'fit s':>8} {'batch rows/s':>13} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>8} {'MAE PLN':>10}")
+    for encoding in ENCODINGS:
+        r = bench(encoding, X_train, X_test, y_train, y_test, args.single)
+        print(f"{encoding:<8} {r['fit_s']:>8.2f} {r['batch_rows_per_s']:>13.0f} {r['single_p50_ms']:>8.2f} "
+              f"{r['single_p99_ms']:>8.2f} {r['size_mb']:>8.2f} {r['mae']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Per-group training scheduler shared by the make and make+model trainers.
+
+Each group (one make, or one make+model) is fitted in its own worker
+process. Groups are submitted largest first so the longest fits start
+early instead of trailing at the end, and every model gets
+TRAIN_CPUS // workers LightGBM threads so the pool never oversubscribes the
+cores it was given.
+
+Retraining is incremental. A manifest next to the models records the data
+fingerprint (row count, max listing id, price checksum) each .pkl was
+trained on, and a <model>.rows.npz sidecar keeps the listing ids and
+targets themselves. On the next run a group is:
+
+    skip  - fingerprint unchanged, the saved model is kept
+    warm  - lightly changed (rows added, removed or re-priced are
+            <= WARM_START_MAX_CHANGE of its rows) with no category values
+            the saved model can't encode: the saved booster keeps
+            boosting for WARM_START_TREES more trees
+    full  - new, heavily changed, trained with other features/encoding,
+            or grown past MAX_TREES by warm starts: refitted from scratch
+
+The validation rows are picked by a hash of the listing id, not drawn at
+random, so a listing stays on the same side of the split across runs and a
+warm-started model is never scored on rows an earlier fit trained on.
+
+Set FULL_RETRAIN=1 to refit everything.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+from sklearn.metrics import mean_absolute_error
+from sklearn.pipeline import Pipeline
+import lightgbm as lgb
+
+from price_features import TRAIN_CPUS, TRAIN_ENCODING, build_pipeline, fit_params, known_categories
+
+TRAIN_WORKERS = int(os.environ.get("TRAIN_WORKERS", TRAIN_CPUS))
+FULL_RETRAIN = os.environ.get("FULL_RETRAIN", "") not in ("", "0")
+
+WARM_START_MAX_CHANGE = 0.2  # fraction of a group's rows
+WARM_START_TREES = 50
+MAX_TREES = 1000  # 500 from a full fit + warm starts
+
+TEST_PERCENT = 20
+SPLIT = "id-hash"  # recorded in the manifest; models from a random split are refitted
+
+
+def group_fingerprint(df):
+    """Fingerprint of the rows a group's model is trained on."""
+    return {
+        "rows": int(len(df)),
+        "max_id": int(df["id"].max()),
+        "price_sum": round(float(df["price"].sum()), 2),
+    }
+
+
+def rows_path(model_path):
+    return os.path.splitext(model_path)[0] + ".rows.npz"
+
+
+def changed_rows(task):
+    """
+    Rows added, removed or re-priced since the saved model was trained,
+    or None when the saved model's rows are unknown.
+    """
+    path = rows_path(task["model_path"])
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as old:
+        old_ids, old_y = old["ids"], old["y"]
+    ids, y = np.asarray(task["ids"]), np.asarray(task["y"])
+    common, new_idx, old_idx = np.intersect1d(ids, old_ids, return_indices=True)
+    repriced = int(np.count_nonzero(y[new_idx] != old_y[old_idx]))
+    return (len(ids) - len(common)) + (len(old_ids) - len(common)) + repriced
+
+
+def holdout_mask(ids):
+    """
+    Validation rows: TEST_PERCENT of the listings, chosen by a hash of the id
+    so each listing always lands on the same side of the split.
+    """
+    h = (np.asarray(ids).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+    mask = h % np.uint64(100) < np.uint64(TEST_PERCENT)
+    if 0 < mask.sum() < len(mask):
+        return mask
+    # Tiny group with an all-or-nothing bucket draw: the smallest hashes are held out
+    n_test = max(1, min(len(mask) - 1, round(len(mask) * TEST_PERCENT / 100)))
+    mask = np.zeros(len(mask), dtype=bool)
+    mask[np.argsort(h, kind="stable")[:n_test]] = True
+    return mask
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def plan_mode(task, prev):
+    """Decide how to (re)train a task given its manifest entry from the last run."""
+    if (FULL_RETRAIN or prev is None or not os.path.exists(task["model_path"])
+            or prev.get("split") != SPLIT
+            or prev["encoding"] != task["encoding"]
+            or prev["features"] != task["num_features"] + task["cat_features"]):
+        return "full"
+
+    fp, old = task["fingerprint"], prev["fingerprint"]
+    if fp == old:
+        return "skip"
+    changed = changed_rows(task)
+    if (changed is not None and changed / max(old["rows"], 1) <= WARM_START_MAX_CHANGE
+            and prev["trees"] + WARM_START_TREES <= MAX_TREES):
+        return "warm"
+    return "full"
+
+
+def warm_start(task, X_train, y_train):
+    """
+    Continue boosting the saved model on the group's current rows.
+    Returns None when the rows hold category values the saved
+    preprocessor can't encode, which only a full fit can learn.
+    """
+    old = joblib.load(task["model_path"])
+    pre = old.named_steps["pre"]  # kept as fitted, so the booster sees the same columns
+    old_model = old.named_steps["model"]
+
+    for col, known in known_categories(pre, task["cat_features"]).items():
+        if not set(X_train[col].dropna().astype(str)) <= known:
+            return None
+
+    model = lgb.LGBMRegressor(**old_model.get_params())
+    model.set_params(n_estimators=WARM_START_TREES, n_jobs=task["n_jobs"])
+    extra = {k.split("__", 1)[1]: v for k, v in fit_params(task["cat_features"], task["encoding"]).items()}
+    model.fit(pre.transform(X_train), y_train, init_model=old_model.booster_, **extra)
+    return Pipeline([("pre", pre), ("model", model)])
+
+
+def fit_group(task):
+    """Fit, score and save one group's model. Runs inside a worker process."""
+    start = time.perf_counter()
+    test = holdout_mask(task["ids"])
+    X_train, X_test = task["X"][~test], task["X"][test]
+    y_train, y_test = task["y"][~test], task["y"][test]
+
+    pipe = warm_start(task, X_train, y_train) if task["mode"] == "warm" else None
+    if pipe is None:
+        task["mode"] = "full"
+        pipe = build_pipeline(task["num_features"], task["cat_features"], task["n_jobs"], task["encoding"])
+        pipe.fit(X_train, y_train, **fit_params(task["cat_features"], task["encoding"]))
+    y_pred = pipe.predict(X_test)
+    mae = mean_absolute_error(np.expm1(y_test), np.expm1(y_pred))
+
+    joblib.dump(pipe, task["model_path"])
+    np.savez(rows_path(task["model_path"]), ids=np.asarray(task["ids"]), y=np.asarray(task["y"]))
+    return {
+        "key": task["key"],
+        "rows": len(task["X"]),
+        "mae": mae,
+        "model_path": task["model_path"],
+        "seconds": time.perf_counter() - start,
+        "mode": task["mode"],
+        "trees": pipe.named_steps["model"].booster_.num_trees(),
+    }
+
+
+def train_groups(tasks, manifest_path, workers=TRAIN_WORKERS):
+    """
+    Retrain the tasks whose data changed since the last run, in a process
+    pool, largest group first. Each task carries the group's listing "ids"
+    and a "fingerprint" from group_fingerprint(). Returns results in the
+    order the tasks were given.
+    """
+    manifest = load_manifest(manifest_path)
+    results = [None] * len(tasks)
+    pending = []
+    for i, task in enumerate(tasks):
+        task.setdefault("encoding", TRAIN_ENCODING)
+        prev = manifest.get(task["key"])
+        task["mode"] = plan_mode(task, prev)
+        if task["mode"] == "skip":
+            results[i] = {
+                "key": task["key"], "rows": prev["fingerprint"]["rows"], "mae": prev["mae"],
+                "model_path": task["model_path"], "seconds": 0.0, "mode": "skip", "trees": prev["trees"],
+            }
+        else:
+            pending.append(i)
+
+    modes = [t["mode"] for t in tasks]
+    print(f"{len(tasks)} groups: {modes.count('skip')} unchanged, "
+          f"{modes.count('warm')} warm-started, {modes.count('full')} full fits")
+
+    if pending:
+        workers = max(1, min(workers, len(pending)))
+        threads = max(1, TRAIN_CPUS // workers)
+        for i in pending:
+            tasks[i]["n_jobs"] = threads
+        print(f"Training {len(pending)} groups on {workers} processes x {threads} threads")
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            largest_first = sorted(pending, key=lambda i: -len(tasks[i]["X"]))
+            futures = {pool.submit(fit_group, tasks[i]): i for i in largest_first}
+            for future in as_completed(futures):
+                i = futures[future]
+                result = future.result()
+                results[i] = result
+                manifest[result["key"]] = {
+                    "fingerprint": tasks[i]["fingerprint"],
+                    "split": SPLIT,
+                    "encoding": tasks[i]["encoding"],
+                    "features": tasks[i]["num_features"] + tasks[i]["cat_features"],
+                    "mae": result["mae"],
+                    "trees": result["trees"],
+                    "model_path": result["model_path"],
+                }
+                # Saved as fits land, so an interrupted run keeps what it finished
+                save_manifest(manifest_path, manifest)
+                print(f"  {result['key']}: MAE = {result['mae']:.2f} PLN "
+                      f"({result['rows']} rows, {result['mode']}, {result['seconds']:.1f}s)")
+        print(f"Trained {len(pending)} groups in {time.perf_counter() - start:.1f}s")
+    return results
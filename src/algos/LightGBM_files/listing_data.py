@@ -0,0 +1,76 @@
+"""
+Training data loader.
+
+Reads listings from the Parquet snapshot written by
+transformations/export_snapshot.py (the version its CURRENT file points
+to): only the requested columns are read,
+make partitions are pruned before any file is opened, and files are
+memory-mapped. Falls back to a column-pruned query on polish_cars.db when
+no snapshot exists yet.
+"""
+
+import os
+import sqlite3
+
+import pandas as pd
+
+DB_PATH = os.environ.get("POLISH_DB", r"src\db\polish_cars.db")
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", r"src\db\snapshot")
+
+
+def snapshot_path(snapshot_dir=SNAPSHOT_DIR):
+    """Directory of the current snapshot version, or None if none was exported."""
+    try:
+        with open(os.path.join(snapshot_dir, "CURRENT"), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(snapshot_dir, version) if version else None
+
+
+def load_listings(columns, makes=None, as_category=False, snapshot_dir=SNAPSHOT_DIR, db_path=DB_PATH):
+    """
+    Load `columns` of the cars table, optionally only for `makes`.
+
+    String columns come back as plain object columns unless as_category=True,
+    in which case they are pandas categories (the snapshot's dictionary
+    encoding, make partition included) on both the snapshot and SQLite paths.
+    """
+    path = snapshot_path(snapshot_dir)
+    if path is not None:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        from pyarrow import fs
+
+        dataset = ds.dataset(
+            path, format="parquet",
+            partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+            filesystem=fs.LocalFileSystem(use_mmap=True),
+        )
+        row_filter = ds.field("make").isin(list(makes)) if makes is not None else None
+        table = dataset.to_table(columns=list(columns), filter=row_filter)
+
+        if not as_category:
+            table = table.cast(pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_dictionary(f.type) else f
+                for f in table.schema
+            ]))
+        df = table.to_pandas()
+        print(f"Loaded {len(df)} rows ({len(columns)} columns) from snapshot {path}")
+        return df
+
+    conn = sqlite3.connect(db_path)
+    query = f"SELECT {', '.join(columns)} FROM cars"
+    params = []
+    if makes is not None:
+        makes = list(makes)
+        query += f" WHERE make IN ({', '.join('?' for _ in makes)})"
+        params = makes
+    df = pd.read_sql(query, conn, params=params)
+    conn.close()
+    if as_category:
+        for col in df.columns:
+            if pd.api.types.is_string_dtype(df[col].dtype):
+                df[col] = df[col].astype("category")
+    print(f"Loaded {len(df)} rows ({len(columns)} columns) from {db_path}")
+    return df
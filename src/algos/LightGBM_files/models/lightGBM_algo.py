@@ -1,27 +1,24 @@
 import sqlite3
+import os
+import sys
 import pandas as pd
 import numpy as np
 import joblib
 
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_absolute_error
-import lightgbm as lgb
+
+# listing_data.py and price_features.py live one level up, next to the other trainers
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from listing_data import load_listings
+from price_features import TRAIN_ENCODING, build_pipeline, fit_params
 
 # ============================
 # 1. Load Data
 # ============================
-print("Loading data from DB...")
-DB_PATH = r"src\db\polish_cars.db"
-TABLE = "cars"
-
-conn = sqlite3.connect(DB_PATH)
-df = pd.read_sql(f"SELECT * FROM {TABLE}", conn)
-conn.close()
-
-print(f"Loaded {len(df)} rows from {TABLE}")
+print("Loading data...")
+COLUMNS = ["make", "model", "year", "mileage", "price", "fuelType", "transmission"]
+df = load_listings(COLUMNS)
 
 
 # ============================
@@ -53,45 +50,22 @@ X = df[num_features + cat_features]
 
 
 # ============================
-# 3. Preprocessing
-# ============================
-print("Setting up preprocessing...")
-preprocessor = ColumnTransformer(
-    transformers=[
-        ("num", "passthrough", num_features),
-        ("cat", OneHotEncoder(handle_unknown="ignore"), cat_features)
-    ]
-)
-
-
-# ============================
-# 4. Model
+# 3. Preprocessing + Model
 # ============================
-print("Setting up model...")
-model = lgb.LGBMRegressor(
-    n_estimators=500,
-    learning_rate=0.05,
-    max_depth=-1,
-    subsample=0.8,
-    colsample_bytree=0.8,
-    random_state=42
-)
-
-pipe = Pipeline([
-    ("pre", preprocessor),
-    ("model", model)
-])
+# One-hot or native categorical codes, see price_features.TRAIN_ENCODING
+print(f"Setting up {TRAIN_ENCODING} pipeline...")
+pipe = build_pipeline(num_features, cat_features)
 
 
 # ============================
-# 5. Train/Test Split
+# 4. Train/Test Split
 # ============================
 print("Training model...")
 X_train, X_test, y_train, y_test = train_test_split(
     X, y, test_size=0.2, random_state=42
 )
 
-pipe.fit(X_train, y_train)
+pipe.fit(X_train, y_train, **fit_params(cat_features))
 y_pred = pipe.predict(X_test)
 
 mae = mean_absolute_error(np.expm1(y_test), np.expm1(y_pred))
@@ -99,7 +73,7 @@ print(f"Validation MAE: {mae:.2f} PLN")
 
 
 # ============================
-# 6. Save Model
+# 5. Save Model
 # ============================
 print("Saving model...")
 MODEL_PATH = r".\src\algos\models\global_GMB_model.pkl"
@@ -108,7 +82,7 @@ print(f"Model saved to {MODEL_PATH}")
 
 
 # ============================
-# 7. Example Scoring
+# 6. Example Scoring
 # ============================
 print("Example prediction...")
 example = {
@@ -0,0 +1,379 @@
+"""
+Batch price prediction for Kijiji listings.
+
+Each listing is routed to the most specific model that exists:
+
+    make+model  models/make_model/<Make>_<Model>.pkl   (lightGBM_per_Make_and_Model.py)
+    make        models/make_level/<Make>.pkl           (lightGBM_make.py)
+    global      src/algos/models/global_GMB_model.pkl  (models/lightGBM_algo.py)
+
+The models are trained on Polish listings, so a Kijiji model name is first
+translated to the Polish name(s) fuzzy_match_models.py matched to it
+(polish_cars.db's model_match_cache), e.g. "3 Series" -> "Seria 3", before
+routing and before it is used as the model feature.
+
+Models are loaded lazily into an LRU cache, and a batch is scored with one
+predict() call per routed model rather than per row. Batch latency
+(p50/p99) and throughput are tracked for every batch.
+
+Usage (from the repo root, where the trainers write their models):
+    python src/algos/LightGBM_files/predict_service.py score
+    python src/algos/LightGBM_files/predict_service.py score --db src/db/kijiji.db --batch-size 2000
+    python src/algos/LightGBM_files/predict_service.py serve --port 8765
+
+The HTTP server answers POST /predict with a JSON list of listings
+({"make", "model", "year", "mileage", "fuelType", "transmission"}) and
+GET /metrics with the latency summary.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import joblib
+import numpy as np
+import pandas as pd
+
+KIJIJI_DB = os.environ.get("KIJIJI_DB", r"src\db\kijiji.db")
+POLISH_DB = os.environ.get("POLISH_DB", r"src\db\polish_cars.db")
+MAKE_MODEL_DIR = os.environ.get("MAKE_MODEL_DIR", r"models/make_model")
+MAKE_DIR = os.environ.get("MAKE_DIR", r"models/make_level")
+GLOBAL_MODEL_PATH = os.environ.get("GLOBAL_MODEL", r".\src\algos\models\global_GMB_model.pkl")
+MODEL_CACHE_SIZE = 64
+BATCH_SIZE = 5000
+MILES_TO_KM = 1.609344
+MATCH_THRESHOLD = 80  # fuzzy_match_models.py keeps matches scoring at least this
+
+FEATURES = ["year", "age", "mileage", "make", "model", "fuelType", "transmission"]
+LEVELS = ("make_model", "make", "global")
+
+
+def normalize_make(make):
+    """fuzzy_match_models.py's block key for a make."""
+    if not isinstance(make, str):
+        return ""
+    make = unicodedata.normalize("NFKD", make).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", make).split())
+
+
+def load_model_names(db_path=POLISH_DB, threshold=MATCH_THRESHOLD):
+    """
+    {(make block, Kijiji model): [Polish models, best match first]}, inverted
+    from the Polish -> Kijiji matches in model_match_cache. Empty when the
+    cache does not exist yet.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT block, clean_model, polish_model FROM model_match_cache
+            WHERE block != '' AND clean_model IS NOT NULL AND score >= ?
+            ORDER BY score DESC, polish_model
+        """, (threshold,)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []  # fuzzy_match_models.py has not run yet
+    finally:
+        conn.close()
+    names = {}
+    for block, clean_model, polish_model in rows:
+        names.setdefault((block, clean_model), []).append(polish_model)
+    return names
+
+
+class ModelCache:
+    """Least-recently-used cache of unpickled model pipelines, keyed by path."""
+
+    def __init__(self, size=MODEL_CACHE_SIZE):
+        self.size = size
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, path):
+        with self.lock:
+            model = self.models.get(path)
+            if model is not None:
+                self.models.move_to_end(path)
+                self.hits += 1
+                return model
+        model = joblib.load(path)  # outside the lock: loads can take a while
+        with self.lock:
+            self.loads += 1
+            self.models[path] = model
+            self.models.move_to_end(path)
+            while len(self.models) > self.size:
+                self.models.popitem(last=False)
+        return model
+
+
+class LatencyMetrics:
+    def __init__(self):
+        self.latencies = []
+        self.rows = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, rows, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.rows += rows
+            self.seconds += seconds
+
+    def summary(self):
+        with self.lock:
+            if not self.latencies:
+                return {"batches": 0, "rows": 0}
+            ms = np.array(self.latencies) * 1000
+            return {
+                "batches": len(ms),
+                "rows": self.rows,
+                "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                "p99_ms": round(float(np.percentile(ms, 99)), 2),
+                "rows_per_s": round(self.rows / self.seconds, 1) if self.seconds else None,
+            }
+
+
+class PricePredictor:
+    def __init__(self, make_model_dir=MAKE_MODEL_DIR, make_dir=MAKE_DIR,
+                 global_path=GLOBAL_MODEL_PATH, cache_size=MODEL_CACHE_SIZE, polish_db=POLISH_DB):
+        self.make_model_dir = make_model_dir
+        self.make_dir = make_dir
+        self.global_path = global_path
+        self.polish_db = polish_db
+        self.cache = ModelCache(cache_size)
+        self.metrics = LatencyMetrics()
+        self.refresh()
+
+    def refresh(self):
+        """Re-list the model directories and model names, e.g. after a training run."""
+        def pkl_files(path):
+            return {f for f in os.listdir(path) if f.endswith(".pkl")} if os.path.isdir(path) else set()
+
+        self.make_model_files = pkl_files(self.make_model_dir)
+        self.make_files = pkl_files(self.make_dir)
+        self.has_global = os.path.exists(self.global_path)
+        self.model_names = load_model_names(self.polish_db)
+
+    @staticmethod
+    def make_model_file(make, model):
+        # Same file name lightGBM_per_Make_and_Model.py saves under
+        return f"{make.replace(' ', '_')}_{model.replace(' ', '_')}.pkl"
+
+    def polish_model(self, make, model):
+        """
+        The Polish name the models know a listing's model by: the matched name
+        with its own make+model model if any, else the best match, else as is.
+        """
+        if not (isinstance(make, str) and make and isinstance(model, str) and model):
+            return model
+        if self.make_model_file(make, model) in self.make_model_files:
+            return model  # already a trained name
+        key = normalize_make(make)
+        # Blocks fall back to a make's first word, as MakeBlockIndex.block_key() does
+        names = self.model_names.get((key, model)) or self.model_names.get((key.split(" ")[0], model))
+        if not names:
+            return model
+        for name in names:
+            if self.make_model_file(make, name) in self.make_model_files:
+                return name
+        return names[0]
+
+    def route(self, make, model):
+        """Return (level, model path) for a make/model pair, or (None, None)."""
+        if isinstance(make, str) and make:
+            if isinstance(model, str) and model:
+                name = self.make_model_file(make, model)
+                if name in self.make_model_files:
+                    return "make_model", os.path.join(self.make_model_dir, name)
+            if f"{make}.pkl" in self.make_files:
+                return "make", os.path.join(self.make_dir, f"{make}.pkl")
+        if self.has_global:
+            return "global", self.global_path
+        return None, None
+
+    @staticmethod
+    def features(df):
+        """Build every column any of the three model levels reads."""
+        out = pd.DataFrame(index=df.index)
+        out["year"] = pd.to_numeric(df["year"], errors="coerce")
+        out["age"] = datetime.datetime.now().year - out["year"]
+        mileage = pd.to_numeric(df["mileage"], errors="coerce")
+        if "mileage_unit" in df:
+            mileage = mileage.where(df["mileage_unit"] != "miles", mileage * MILES_TO_KM)
+        out["mileage"] = mileage
+        # JSON clients may send numbers for any field, so text columns are coerced
+        for col in ("make", "model"):
+            out[col] = df[col].astype("string").fillna("unknown").astype(object)
+        # Training data is normalized to lower case English (translatePLdb.py)
+        for col in ("fuelType", "transmission"):
+            values = df[col].astype("string")
+            out[col] = values.where(values.notna() & (values != ""), "unknown").str.lower().astype(object)
+        return out
+
+    def predict(self, df):
+        """
+        Predict prices (PLN) for a frame of listings.
+        Returns a frame with predicted_price and model_level, aligned on df's index.
+        """
+        start = time.perf_counter()
+        X = self.features(df)
+
+        # Translate and route each distinct (make, model) once, then broadcast to rows
+        pairs = X[["make", "model"]].drop_duplicates()
+        names = {
+            (make, model): self.polish_model(make, model)
+            for make, model in pairs.itertuples(index=False)
+        }
+        X["model"] = [names[pair] for pair in zip(X["make"], X["model"])]
+        pairs = X[["make", "model"]].drop_duplicates()
+        routes = pd.DataFrame(
+            [self.route(make, model) for make, model in pairs.itertuples(index=False)],
+            columns=["model_level", "model_path"], index=pairs.index,
+        )
+        routed = X[["make", "model"]].merge(
+            pd.concat([pairs, routes], axis=1), on=["make", "model"], how="left"
+        )
+        routed.index = X.index
+
+        result = pd.DataFrame({"predicted_price": np.nan, "model_level": routed["model_level"]}, index=X.index)
+        for path, idx in routed.groupby("model_path").groups.items():
+            pipe = self.cache.get(path)
+            result.loc[idx, "predicted_price"] = np.expm1(pipe.predict(X.loc[idx, FEATURES]))
+
+        self.metrics.record(len(df), time.perf_counter() - start)
+        return result
+
+
+def score_db(predictor, db_path=KIJIJI_DB, batch_size=BATCH_SIZE):
+    """Score every parsed Kijiji listing and store the results in price_predictions."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS price_predictions (
+            id INTEGER PRIMARY KEY,
+            predicted_price REAL,
+            model_level TEXT,
+            predicted_at TEXT
+        )
+    """)
+    query = """
+        SELECT id, make, model, year, mileage, mileage_unit, fuelType, transmission
+        FROM cars
+        WHERE make IS NOT NULL AND make != ''
+    """
+    predicted_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    levels = dict.fromkeys(LEVELS, 0)
+    rows = []
+    for chunk in pd.read_sql(query, conn, chunksize=batch_size):
+        result = predictor.predict(chunk)
+        for level, count in result["model_level"].value_counts().items():
+            levels[level] += int(count)
+        scored = result["predicted_price"].notna()
+        rows.extend(zip(
+            chunk.loc[scored, "id"].tolist(),
+            result.loc[scored, "predicted_price"].round(2).tolist(),
+            result.loc[scored, "model_level"].tolist(),
+            [predicted_at] * int(scored.sum()),
+        ))
+
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO price_predictions VALUES (?, ?, ?, ?)", rows)
+    conn.close()
+    print(f"Scored {len(rows)} listings: " + ", ".join(f"{k} {v}" for k, v in levels.items()))
+    return rows
+
+
+def make_handler(predictor):
+    class PredictHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self.send_json(200, {
+                    **predictor.metrics.summary(),
+                    "cached_models": len(predictor.cache.models),
+                    "cache_hits": predictor.cache.hits,
+                    "model_loads": predictor.cache.loads,
+                })
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self.send_json(404, {"error": "not found"})
+                return
+            try:
+                listings = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                df = pd.DataFrame(listings if isinstance(listings, list) else [listings])
+                for col in ("make", "model", "year", "mileage", "fuelType", "transmission"):
+                    if col not in df:
+                        df[col] = None
+            except (ValueError, TypeError) as e:
+                self.send_json(400, {"error": f"bad request body: {e}"})
+                return
+            try:
+                result = predictor.predict(df)
+            except (ValueError, TypeError) as e:
+                self.send_json(400, {"error": f"bad listing values: {e}"})
+                return
+            except Exception as e:
+                self.send_json(500, {"error": f"prediction failed: {e}"})
+                return
+            self.send_json(200, [
+                {"predicted_price": None if np.isnan(p) else round(float(p), 2), "model_level": level}
+                for p, level in zip(result["predicted_price"], result["model_level"])
+            ])
+
+        def log_message(self, format, *args):
+            pass  # one line per request is too noisy at batch rates
+
+    return PredictHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch price predictions with make+model -> make -> global routing")
+    sub = parser.add_subparsers(dest="command", required=True)
+    score = sub.add_parser("score", help="score the Kijiji DB into price_predictions")
+    score.add_argument("--db", default=KIJIJI_DB)
+    score.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    serve = sub.add_parser("serve", help="run the local HTTP endpoint")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=MODEL_CACHE_SIZE, help="models kept loaded")
+    args = parser.parse_args()
+
+    predictor = PricePredictor(cache_size=args.cache_size)
+    if args.command == "score":
+        start = time.perf_counter()
+        score_db(predictor, args.db, args.batch_size)
+        print(f"Done in {time.perf_counter() - start:.1f}s, "
+              f"{predictor.cache.loads} models loaded, metrics: {predictor.metrics.summary()}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(predictor))
+        print(f"Serving predictions on http://{args.host}:{args.port} (POST /predict, GET /metrics)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            print(f"Metrics: {predictor.metrics.summary()}")
+
+
+if __name__ == "__main__":
+    main()
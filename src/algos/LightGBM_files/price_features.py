@@ -0,0 +1,101 @@
+"""
+Feature pipelines shared by the price model trainers.
+
+Two encodings of the categorical columns (make, model, fuelType,
+transmission) are available:
+
+    onehot  - OneHotEncoder in a ColumnTransformer (the original pipeline)
+    native  - integer category codes from a vocabulary learned at fit time
+              and pickled with the pipeline, split on by LightGBM's own
+              categorical handling instead of a wide sparse matrix
+
+TRAIN_ENCODING picks the one the trainers use; bench_encoding.py compares
+them on the same split.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+import lightgbm as lgb
+
+TRAIN_ENCODING = os.environ.get("TRAIN_ENCODING", "onehot")
+# Cores a trainer may use; run_pipeline.py splits them between concurrent trainers
+TRAIN_CPUS = max(1, int(os.environ.get("TRAIN_CPUS", os.cpu_count() or 1)))
+ENCODINGS = ("onehot", "native")
+
+
+class CategoryCodeEncoder(BaseEstimator, TransformerMixin):
+    """
+    Pass numeric columns through and replace categorical ones by integer codes.
+
+    vocabulary_ maps each categorical column to its list of known values;
+    a value's code is its position in that list. Values not seen at fit
+    time become -1, which LightGBM treats as missing.
+    """
+
+    def __init__(self, num_features, cat_features):
+        self.num_features = num_features
+        self.cat_features = cat_features
+
+    def fit(self, X, y=None):
+        self.vocabulary_ = {
+            col: sorted(pd.unique(X[col].dropna().astype(str)))
+            for col in self.cat_features
+        }
+        return self
+
+    def transform(self, X):
+        out = {col: pd.to_numeric(X[col], errors="coerce").to_numpy(dtype=np.float64) for col in self.num_features}
+        for col in self.cat_features:
+            values = X[col].astype(object).where(X[col].notna(), None)
+            codes = pd.Categorical(values, categories=self.vocabulary_[col]).codes
+            out[col] = codes.astype(np.int32)
+        return pd.DataFrame(out, index=X.index)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(list(self.num_features) + list(self.cat_features), dtype=object)
+
+
+def build_pipeline(num_features, cat_features, n_jobs=TRAIN_CPUS, encoding=TRAIN_ENCODING):
+    if encoding == "native":
+        preprocessor = CategoryCodeEncoder(num_features, cat_features)
+    elif encoding == "onehot":
+        preprocessor = ColumnTransformer(
+            transformers=[
+                ("num", "passthrough", num_features),
+                ("cat", OneHotEncoder(handle_unknown="ignore"), cat_features)
+            ]
+        )
+    else:
+        raise ValueError(f"unknown encoding {encoding!r}, choose from {ENCODINGS}")
+
+    model = lgb.LGBMRegressor(
+        n_estimators=500,
+        learning_rate=0.05,
+        max_depth=-1,
+        subsample=0.8,
+        colsample_bytree=0.8,
+        random_state=42,
+        n_jobs=n_jobs,
+    )
+    return Pipeline([("pre", preprocessor), ("model", model)])
+
+
+def fit_params(cat_features, encoding=TRAIN_ENCODING):
+    """Extra Pipeline.fit() arguments for `encoding`."""
+    if encoding == "native":
+        return {"model__categorical_feature": list(cat_features)}
+    return {}
+
+
+def known_categories(preprocessor, cat_features):
+    """Per categorical column, the set of values a fitted preprocessor can encode."""
+    if isinstance(preprocessor, CategoryCodeEncoder):
+        return {col: set(preprocessor.vocabulary_[col]) for col in cat_features}
+    encoder = preprocessor.named_transformers_["cat"]
+    return {col: set(values) for col, values in zip(cat_features, encoder.categories_)}
@@ -0,0 +1,265 @@
+"""
+End-to-end pipeline orchestrator.
+
+Runs the project's scripts as a DAG of stages, from the repo root:
+
+    migrate_dbs -> crawl (optional) -> normalize_pl -> merge_pl -> export_snapshot -> train_* -> predict_kijiji
+                                    -> process_titles -> extract_clean_models -> fuzzy_match -> comparables, opportunities
+
+Before running a stage it fingerprints the stage's inputs (row count and
+max rowid of the tables it reads, plus a hash of its script and lookup
+files). A stage whose fingerprint matches the last successful run is
+skipped, unless one of its dependencies ran in this run: the fingerprints
+cannot see rows changed in place by UPDATEs. Stages whose dependencies are
+done run in parallel, and a timing report is printed at the end.
+
+The train_* stages can run side by side, so each gets a share of the cores
+(TRAIN_CPUS) for its LightGBM threads instead of every trainer using all of
+them.
+
+The Polish sources are normalized before the merge, so one merge carries
+the normalized values over; the merge compares every column of already
+merged rows, so later fixes to a source reach polish_cars.db on the next run.
+
+Usage (from the repo root):
+    python src/run_pipeline.py
+    python src/run_pipeline.py --crawl --jobs 4
+    python src/run_pipeline.py --force --only merge_pl train_make
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPER_DIR = os.path.join(REPO_ROOT, "src", "scrapers", "listingScraper")
+
+
+class Stage:
+    def __init__(self, name, cmd, deps=(), tables=(), files=(), cwd=REPO_ROOT, always=False, dirties=True):
+        self.name = name
+        self.cmd = cmd
+        self.deps = list(deps)
+        self.tables = list(tables)  # (db path, table[, checksum column])
+        self.files = list(files)
+        self.cwd = cwd
+        self.always = always  # no fingerprint, e.g. crawls
+        self.dirties = dirties  # running it reruns its dependents
+
+
+def table_fingerprint(db_path, table, checksum_col=None):
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        extra = f", total({checksum_col})" if checksum_col else ""
+        return list(conn.execute(f"SELECT count(*), max(rowid){extra} FROM {table}").fetchone())
+    except sqlite3.OperationalError:
+        return None  # table not created yet
+    finally:
+        conn.close()
+
+
+def file_fingerprint(path):
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def fingerprint(stage):
+    return {
+        "tables": [table_fingerprint(*t) for t in stage.tables],
+        "files": [file_fingerprint(p) for p in stage.files],
+    }
+
+
+def build_stages(dbs, crawl):
+    py = sys.executable
+    tr = os.path.join(REPO_ROOT, "src", "transformations")
+    lgb = os.path.join(REPO_ROOT, "src", "algos", "LightGBM_files")
+    lookups = os.path.join(REPO_ROOT, "src", "lookups", "makes_models.json")
+
+    # Schema migrations are a no-op once a DB is current; crawls migrate on connect anyway.
+    # polish_cars.db is left to merge_pl, which creates it with AUTOINCREMENT ids
+    stages = [Stage(
+        "migrate_dbs",
+        [py, "-m", "listingScraper.migrations"] + [dbs[k] for k in ("KIJIJI_DB", "GRATKA_DB", "AUTOTRADER_DB")],
+        cwd=SCRAPER_DIR, always=True, dirties=False,  # a no-op on current DBs
+    )]
+    crawl_deps = {"kijiji": ["migrate_dbs"], "polish": ["migrate_dbs"]}
+    if crawl:
+        db_dir = os.path.dirname(dbs["KIJIJI_DB"])
+        for spider, branch in (("kijiji", "kijiji"), ("gratka", "polish"), ("autoTraderPL", "polish")):
+            name = f"crawl_{spider}"
+            stages.append(Stage(
+                name, [py, "-m", "scrapy", "crawl", spider, "-s", f"SQLITE_DB_DIR={db_dir}"],
+                deps=["migrate_dbs"], cwd=SCRAPER_DIR, always=True,
+            ))
+            crawl_deps[branch].append(name)
+
+    kijiji = (dbs["KIJIJI_DB"], "cars")
+    polish_sources = [(dbs["GRATKA_DB"], "cars", "price"), (dbs["AUTOTRADER_DB"], "cars", "price")]
+    polish = (dbs["POLISH_DB"], "cars", "price")
+
+    stages += [
+        # Polish branch
+        Stage("normalize_pl", [py, os.path.join(tr, "translatePLdb.py")], deps=crawl_deps["polish"],
+              tables=polish_sources, files=[os.path.join(tr, "translatePLdb.py")]),
+        Stage("merge_pl", [py, os.path.join(tr, "MergePLdb.py")], deps=["normalize_pl"],
+              tables=polish_sources, files=[os.path.join(tr, "MergePLdb.py")]),
+        # Kijiji branch
+        Stage("process_titles", [py, os.path.join(tr, "process_titles.py")], deps=crawl_deps["kijiji"],
+              tables=[kijiji],
+              files=[os.path.join(tr, "process_titles.py"), os.path.join(tr, "utils", "title_parser.py"), lookups]),
+        Stage("extract_clean_models", [py, os.path.join(tr, "extract_clean_models.py")], deps=["process_titles"],
+              tables=[kijiji], files=[os.path.join(tr, "extract_clean_models.py")]),
+        # Join + training
+        Stage("fuzzy_match", [py, os.path.join(tr, "fuzzy_match_models.py")],
+              deps=["merge_pl", "extract_clean_models"],
+              tables=[(dbs["KIJIJI_DB"], "clean_make_models"), polish],
+              files=[os.path.join(tr, "fuzzy_match_models.py")]),
+        Stage("comparables", [py, os.path.join(tr, "comparables.py")], deps=["fuzzy_match"],
+              tables=[kijiji, (dbs["POLISH_DB"], "filtered_models", "price")],
+              files=[os.path.join(tr, "comparables.py")]),
+        Stage("opportunities", [py, os.path.join(tr, "opportunities.py")], deps=["fuzzy_match"],
+              tables=[(dbs["KIJIJI_DB"], "cars", "price"), (dbs["POLISH_DB"], "filtered_models", "price")],
+              files=[os.path.join(tr, "opportunities.py"), os.path.join(tr, "comparables.py")]),
+        Stage("export_snapshot", [py, os.path.join(tr, "export_snapshot.py")], deps=["merge_pl"],
+              tables=[polish], files=[os.path.join(tr, "export_snapshot.py")]),
+        Stage("train_make", [py, os.path.join(lgb, "lightGBM_make.py")], deps=["export_snapshot"],
+              tables=[polish], files=[os.path.join(lgb, "lightGBM_make.py")]),
+        Stage("train_make_model", [py, os.path.join(lgb, "lightGBM_per_Make_and_Model.py")], deps=["export_snapshot"],
+              tables=[polish], files=[os.path.join(lgb, "lightGBM_per_Make_and_Model.py")]),
+        Stage("train_global", [py, os.path.join(lgb, "models", "lightGBM_algo.py")], deps=["export_snapshot"],
+              tables=[polish], files=[os.path.join(lgb, "models", "lightGBM_algo.py")]),
+        # Scoring: reruns when the listings or any level's models change
+        Stage("predict_kijiji", [py, os.path.join(lgb, "predict_service.py"), "score", "--db", dbs["KIJIJI_DB"]],
+              deps=["process_titles", "train_make", "train_make_model", "train_global"],
+              tables=[kijiji], files=[
+                  os.path.join(lgb, "predict_service.py"),
+                  os.path.join(REPO_ROOT, "models", "make_level", "make_level_MAE_log.txt"),
+                  os.path.join(REPO_ROOT, "models", "make_model_mae.log"),
+                  os.path.join(REPO_ROOT, "src", "algos", "models", "global_GMB_model.pkl"),
+              ]),
+    ]
+    return stages
+
+
+def load_state(path):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(path, state):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+def run_stage(stage, env, log_dir):
+    log_path = os.path.join(log_dir, f"{stage.name}.log")
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        code = subprocess.run(stage.cmd, cwd=stage.cwd, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+    return code, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the arbitrage data pipeline as a DAG")
+    parser.add_argument("--db-dir", default=os.path.join(REPO_ROOT, "src", "db"), help="where the SQLite DBs live")
+    parser.add_argument("--crawl", action="store_true", help="run the spiders first")
+    parser.add_argument("--jobs", type=int, default=2, help="stages run at once")
+    parser.add_argument("--force", action="store_true", help="ignore fingerprints and rerun")
+    parser.add_argument("--only", nargs="+", metavar="STAGE", help="run just these stages (deps assumed done)")
+    args = parser.parse_args()
+
+    dbs = {
+        "KIJIJI_DB": os.path.join(args.db_dir, "kijiji.db"),
+        "GRATKA_DB": os.path.join(args.db_dir, "gratka.db"),
+        "AUTOTRADER_DB": os.path.join(args.db_dir, "autotrader.pl.db"),
+        "POLISH_DB": os.path.join(args.db_dir, "polish_cars.db"),
+        "SNAPSHOT_DIR": os.path.join(args.db_dir, "snapshot"),
+    }
+    # Up to three trainers run at once when --jobs allows it
+    train_cpus = max(1, (os.cpu_count() or 1) // max(1, min(args.jobs, 3)))
+    env = {**os.environ, **dbs, "TRAIN_CPUS": os.environ.get("TRAIN_CPUS", str(train_cpus))}
+    state_path = os.path.join(args.db_dir, "pipeline_state.json")
+    log_dir = os.path.join(args.db_dir, "pipeline_logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    stages = {s.name: s for s in build_stages(dbs, args.crawl)}
+    if args.only:
+        unknown = set(args.only) - set(stages)
+        if unknown:
+            parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}; choose from {', '.join(stages)}")
+        stages = {n: s for n, s in stages.items() if n in args.only}
+        for s in stages.values():
+            s.deps = [d for d in s.deps if d in stages]
+
+    state = load_state(state_path)
+    report = {}  # name -> (status, seconds)
+    pending = dict(stages)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                dep_status = [report.get(d, (None,))[0] for d in stage.deps]
+                if any(s in ("failed", "blocked") for s in dep_status):
+                    report[name] = ("blocked", 0.0)
+                    del pending[name]
+                    continue
+                if any(s is None for s in dep_status):
+                    continue  # dependency still pending or running
+
+                del pending[name]
+                fp = None if stage.always else fingerprint(stage)
+                # A dependency that ran may have changed rows in place (UPDATEs
+                # leave count and max rowid alone), so its dependents rerun too
+                upstream_ran = any(report[d][0] == "ran" and stages[d].dirties for d in stage.deps)
+                if fp is not None and not args.force and not upstream_ran and state.get(name) == fp:
+                    report[name] = ("skipped", 0.0)
+                    print(f"[skip] {name}: inputs unchanged")
+                    continue
+                print(f"[run ] {name}")
+                running[pool.submit(run_stage, stage, env, log_dir)] = (name, fp)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fp = running.pop(future)
+                code, seconds = future.result()
+                if code == 0:
+                    report[name] = ("ran", seconds)
+                    if fp is not None:
+                        # Fingerprint taken before the run: anything written since counts as new input
+                        state[name] = fp
+                        save_state(state_path, state)
+                else:
+                    report[name] = ("failed", seconds)
+                    print(f"[fail] {name}: exit {code}, see {os.path.join(log_dir, name + '.log')}")
+
+    print("\nStage timings")
+    total = 0.0
+    for name in stages:
+        status, seconds = report[name]
+        total += seconds
+        print(f"  {name:<22} {status:<8} {seconds:8.1f}s")
+    print(f"  {'total (serial)':<22} {'':<8} {total:8.1f}s")
+    return 1 if any(s == "failed" for s, _ in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
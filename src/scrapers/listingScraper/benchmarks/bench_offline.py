@@ -0,0 +1,188 @@
+"""
+Offline scraping benchmark: parsing + pipeline, no network.
+
+Runs the saved fixtures through the real spider callbacks (kijiji, gratka
+index + detail, autoTraderPL) and pushes every item through a SQLite
+pipeline into a temporary DB. Reports time per stage, items/s and peak RSS.
+
+Fixtures live in benchmarks/fixtures/<spider>/*.html and
+benchmarks/fixtures/gratka_detail/*.html; --from-cache fills them from the
+response cache written by ListingscraperDownloaderMiddleware.
+
+The run happens under a Twisted reactor, so the threaded pipeline keeps
+its bounded queue (--queue-size, default SQLITE_QUEUE_SIZE's 5000) and its
+backpressure Deferreds are waited on like the engine would; the report
+counts how many items had to wait. The timed close_spider() waits for the
+writer to drain everything.
+
+Usage (from src/scrapers/listingScraper):
+    python -m benchmarks.bench_offline
+    python -m benchmarks.bench_offline --pipeline buffered --repeat 10
+    python -m benchmarks.bench_offline --pipeline threaded --queue-size 50
+    python -m benchmarks.bench_offline --from-cache httpcache.db
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import tempfile
+import time
+
+from twisted.internet import defer, task
+
+from listingScraper.pipelines import BufferedSQLitePipeline, SQLitePipeline, ThreadedSQLitePipeline
+from listingScraper.spiders.autoTraderPL import AutotraderplSpider
+from listingScraper.spiders.gratka import GratkaSpider
+from listingScraper.spiders.kijiji import KijijiSpider
+
+from benchmarks.pages import detail_responses, export_cached_pages, load_pages
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PIPELINES = {
+    "simple": SQLitePipeline,
+    "buffered": BufferedSQLitePipeline,
+    "threaded": ThreadedSQLitePipeline,
+}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageTimer:
+    def __init__(self):
+        self.totals = {}
+
+    def time(self, stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+    @defer.inlineCallbacks
+    def time_deferred(self, stage, func, *args):
+        start = time.perf_counter()
+        result = yield func(*args)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+    def add(self, stage, seconds):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+
+def parse_pages(spider, pages):
+    items, requests = [], []
+    for page in pages:
+        for result in spider.parse(page.replace(body=page.body)):
+            if isinstance(result, dict):
+                items.append(result)
+            elif result.callback != spider.parse:
+                requests.append(result)
+    return items, requests
+
+
+def parse_details(spider, responses):
+    items = []
+    for response in responses:
+        items.extend(spider.parse_detail(response))
+    return items
+
+
+@defer.inlineCallbacks
+def write_items(pipeline, spider, items):
+    """Push items through the pipeline; returns how many waited on backpressure."""
+    waited = 0
+    for item in items:
+        result = pipeline.process_item(item, spider)
+        if isinstance(result, defer.Deferred):
+            waited += 1
+            result = yield result  # queue full: the engine would wait here too
+        if result is not item:
+            raise RuntimeError(f"{type(pipeline).__name__} did not pass the item on")
+    return waited
+
+
+def make_pipeline(name, queue_size):
+    if name == "threaded":
+        return ThreadedSQLitePipeline(queue_size=queue_size)
+    return PIPELINES[name]()
+
+
+def stored_rows(db_dir):
+    """Rows that reached the source DBs, to catch items a pipeline lost."""
+    total = 0
+    for path in glob.glob(os.path.join(db_dir, "*.db")):
+        conn = sqlite3.connect(path)
+        total += conn.execute("SELECT count(*) FROM cars").fetchone()[0]
+        conn.close()
+    return total
+
+
+@defer.inlineCallbacks
+def run(pipeline_name, repeat, queue_size):
+    timer = StageTimer()
+    spiders = [KijijiSpider(), GratkaSpider(), AutotraderplSpider()]
+    index_pages = {spider.name: timer.time("load fixtures", load_pages, type(spider)) for spider in spiders}
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        pipeline = make_pipeline(pipeline_name, queue_size)
+        pipeline.db_dir = db_dir
+        pipeline.open_spider(None)
+
+        total_items = waited = 0
+        for _ in range(repeat):
+            for spider in spiders:
+                pages = index_pages[spider.name]
+                if not pages:
+                    continue
+                items, requests = timer.time(f"{spider.name} parse", parse_pages, spider, pages)
+
+                if requests:
+                    responses = timer.time("load fixtures", detail_responses, requests, f"{spider.name}_detail")
+                    items += timer.time(f"{spider.name} parse_detail", parse_details, spider, responses)
+
+                waited += yield timer.time_deferred("pipeline", write_items, pipeline, spider, items)
+                total_items += len(items)
+
+        timer.time("pipeline", pipeline.close_spider, None)
+        stored = stored_rows(db_dir)
+
+    total = sum(timer.totals.values())
+    queue = f", queue size {queue_size}" if pipeline_name == "threaded" else ""
+    print(f"Pipeline: {PIPELINES[pipeline_name].__name__}{queue}, {repeat} pass(es)")
+    for stage, seconds in timer.totals.items():
+        print(f"  {stage:<24} {seconds:8.3f}s  ({seconds / total:6.1%})")
+    print(f"  {'total':<24} {total:8.3f}s")
+    if total_items:
+        print(f"Items: {total_items} -> {total_items / total:,.0f} items/s end to end, "
+              f"{stored} distinct listings stored, {waited} waited on a full queue")
+    else:
+        print("Items: 0 (no fixtures found, see benchmarks/fixtures/)")
+    rss = peak_rss_mb()
+    print(f"Peak RSS: {rss:.1f} MB" if rss is not None else "Peak RSS: n/a on this platform")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline parse + pipeline benchmark over saved pages")
+    parser.add_argument("--pipeline", choices=sorted(PIPELINES), default="simple")
+    parser.add_argument("--repeat", type=int, default=5, help="passes over the fixtures")
+    parser.add_argument("--queue-size", type=int, default=5000, help="threaded pipeline queue bound")
+    parser.add_argument("--from-cache", metavar="CACHE_DB", help="export fixtures from the response cache first")
+    args = parser.parse_args()
+
+    if args.from_cache:
+        written = export_cached_pages(args.from_cache)
+        print(f"Exported fixtures from {args.from_cache}: {written}")
+    task.react(lambda reactor: run(args.pipeline, args.repeat, args.queue_size))
+
+
+if __name__ == "__main__":
+    main()
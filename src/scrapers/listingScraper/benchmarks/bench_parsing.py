@@ -0,0 +1,167 @@
+"""
+Micro-benchmark for the spiders' parse callbacks.
+
+Feeds saved HTML pages through each spider's parse() and reports listings
+parsed per second. Pages are read from benchmarks/fixtures/<spider>/*.html;
+the shipped ones are small synthetic pages with the sites' markup, save real
+index pages there from the browser or from the response cache.
+
+Before timing, every fixture is also parsed with the spiders' original
+inline parsel queries, and the precompiled selectors in parsing.py must
+extract exactly the same fields.
+
+Usage (from src/scrapers/listingScraper):
+    python -m benchmarks.bench_parsing
+    python -m benchmarks.bench_parsing --repeat 50 --spider kijiji
+"""
+
+import argparse
+import os
+import time
+
+from listingScraper import parsing
+from listingScraper.spiders.autoTraderPL import AutotraderplSpider
+from listingScraper.spiders.gratka import GratkaSpider
+from listingScraper.spiders.kijiji import KijijiSpider
+
+from benchmarks.pages import FIXTURES_DIR, fixture_bodies, load_pages
+
+SPIDERS = {
+    "kijiji": KijijiSpider,
+    "gratka": GratkaSpider,
+    "autoTraderPL": AutotraderplSpider,
+}
+
+
+
+# ============================
+# Selectors as the spiders ran them before parsing.py
+# ============================
+def legacy_kijiji_cards(response):
+    cards = []
+    for listing in response.xpath('//*[@id="base-layout-main-wrapper"]/div[4]/div[1]/div[2]/div[3]/ul/li'):
+        features = [f.strip() for f in listing.xpath('.//div[contains(@class,"ffNurV")]/div/p/text()').getall()]
+        mileage = transmission = fuel_type = ""
+        for f in features:
+            f_lower = f.lower()
+            if "km" in f_lower or "miles" in f_lower:
+                mileage = f
+            elif f_lower in ["automatic", "manual", "cvt"]:
+                transmission = f
+            elif f_lower in ["gas", "diesel", "electric", "hybrid"]:
+                fuel_type = f
+        cards.append({
+            "title": listing.xpath(".//h3/a/text()").get(default="").strip(),
+            "price": listing.xpath('.//section/div[1]/div[2]/div[1]/div[1]/div/p/text()').get(default="").strip(),
+            "link": listing.xpath(".//h3/a/@href").get(default="").strip(),
+            "mileage": mileage,
+            "transmission": transmission,
+            "fuelType": fuel_type,
+        })
+    return cards
+
+
+def legacy_gratka_cards(response):
+    return [{
+        "title": listing.xpath('.//h2[@class="teaserUnified__title"]/text()').get(default="").strip(),
+        "price": listing.xpath('.//p[@class="teaserUnified__price"]/text()').get(default="").strip(),
+        "link": listing.xpath('.//a[@class="teaserLink"]/@href').get(),
+        "mileage": listing.xpath('.//li[contains(text(), "Przebieg")]/text()').get(default=""),
+        "location": listing.xpath('.//span[@class="teaserUnified__location"]/text()').get(default="").strip(),
+    } for listing in response.xpath('//div[@class="listing__teaserWrapper"]')]
+
+
+def legacy_gratka_detail(response):
+    return {
+        "year": response.xpath('//li[span[contains(text(),"Rok produkcji")]]/b/text()').get(default="").strip(),
+        "fuelType": response.xpath('//li[span[contains(text(),"Rodzaj paliwa")]]/b/text()').get(default="").strip(),
+        "transmission": response.xpath('//li[span[contains(text(),"Skrzynia biegów")]]/b/text()').get(default="").strip(),
+    }
+
+
+def legacy_autotrader_cards(response):
+    return [{
+        "title": listing.css("h2::text").get(default="").strip(),
+        "details": listing.css("div.offer-card__basic p::text").get(default="").strip(),
+        "price": listing.css("div.offer-card__price strong::text").get(default="").strip(),
+        "link": listing.css("a::attr(href)").get(default="").strip(),
+        "year": listing.css("div.offer-card__details span[title]::attr(title)").re_first(r"\d{4}"),
+        "mileage": listing.css("div.offer-card__details span.offer-detail::text").re_first(r"[\d\s]+ km"),
+        "fuelType": listing.css("div.offer-card__details span.offer-detail::text").re_first(r"(benzyna|diesel|hybryda|elektryczny)"),
+        "region": listing.css("span.offer-detail--city::attr(title)").get(default=""),
+    } for listing in response.css("div.offer-card")]
+
+
+SELECTOR_PAIRS = {
+    "kijiji": (legacy_kijiji_cards, parsing.KIJIJI_LISTINGS, parsing.kijiji_card_fields),
+    "gratka": (legacy_gratka_cards, parsing.GRATKA_LISTINGS, parsing.gratka_card_fields),
+    "autoTraderPL": (legacy_autotrader_cards, parsing.AUTOTRADER_LISTINGS, parsing.autotrader_card_fields),
+}
+
+
+def check_selectors(spider_cls, pages):
+    """Assert parsing.py extracts the same fields as the original inline queries."""
+    legacy, listings, card_fields = SELECTOR_PAIRS[spider_cls.name]
+    cards = 0
+    for page in pages:
+        old = legacy(page)
+        new = [card_fields(card) for card in listings(page.selector.root)]
+        assert new == old, f"{spider_cls.name}: selectors disagree on {page.url}"
+        cards += len(new)
+
+    if spider_cls is GratkaSpider:
+        for response in load_detail_pages():
+            assert parsing.gratka_detail_fields(response.selector.root) == legacy_gratka_detail(response), \
+                f"gratka: detail selectors disagree on {response.url}"
+    return cards
+
+
+def load_detail_pages():
+    from scrapy.http import HtmlResponse
+
+    return [
+        HtmlResponse(url=f"https://gratka.pl/motoryzacja/detail-{i}", body=body, encoding="utf-8")
+        for i, body in enumerate(fixture_bodies("gratka_detail"))
+    ]
+
+
+def bench_spider(spider_cls, repeat):
+    pages = load_pages(spider_cls)
+    if not pages:
+        print(f"{spider_cls.name:>14}: no fixtures in {os.path.join(FIXTURES_DIR, spider_cls.name)}")
+        return
+    cards = check_selectors(spider_cls, pages)
+    print(f"{spider_cls.name:>14}: selectors match the original queries on {cards} cards")
+
+    spider = spider_cls()
+    listings = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            # Fresh response each round so parsel does not reuse the parsed tree
+            response = page.replace(body=page.body)
+            for result in spider.parse(response):
+                # Gratka yields one detail request per listing, the others yield items
+                if isinstance(result, dict) or result.callback != spider.parse:
+                    listings += 1
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{spider_cls.name:>14}: {listings} listings from {len(pages) * repeat} pages "
+        f"in {elapsed:.3f}s -> {listings / elapsed:,.0f} listings/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark spider parse() over saved HTML pages")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the fixtures")
+    parser.add_argument("--spider", choices=sorted(SPIDERS), help="only benchmark one spider")
+    args = parser.parse_args()
+
+    names = [args.spider] if args.spider else list(SPIDERS)
+    for name in names:
+        bench_spider(SPIDERS[name], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Load saved marketplace pages from benchmarks/fixtures as Scrapy responses."""
+
+import glob
+import os
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture_bodies(name):
+    """Raw HTML of every fixtures/<name>/*.html file, in name order."""
+    bodies = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, name, "*.html"))):
+        with open(path, "rb") as f:
+            bodies.append(f.read())
+    return bodies
+
+
+def load_pages(spider_cls):
+    """Return HtmlResponses for every saved index page of a spider."""
+    responses = []
+    for i, body in enumerate(fixture_bodies(spider_cls.name)):
+        url = spider_cls.page_url(spider_cls.page_numbers[0] + i)
+        # Tied to a request so callbacks can read response.meta
+        responses.append(HtmlResponse(url=url, body=body, encoding="utf-8", request=Request(url)))
+    return responses
+
+
+def detail_responses(requests, name):
+    """
+    Answer detail-page requests with saved detail pages (fixtures/<name>/),
+    cycling through them, so parse_detail sees the meta parse() attached.
+    """
+    bodies = fixture_bodies(name)
+    if not bodies:
+        return []
+    return [
+        HtmlResponse(url=request.url, body=bodies[i % len(bodies)], encoding="utf-8", request=request)
+        for i, request in enumerate(requests)
+    ]
+
+
+def export_cached_pages(cache_path, per_kind=5):
+    """
+    Copy pages from the response cache (LISTING_CACHE_PATH) into fixtures/.
+    Gratka detail pages go to fixtures/gratka_detail, index pages to fixtures/<spider>.
+    """
+    import sqlite3
+    import zlib
+
+    conn = sqlite3.connect(cache_path)
+    written = {}
+    for url, spider, body in conn.execute("SELECT url, spider, body FROM responses WHERE status = 200 ORDER BY url"):
+        kind = spider
+        if spider == "gratka" and "motoryzacja?page=" not in url:
+            kind = "gratka_detail"
+        if written.get(kind, 0) >= per_kind:
+            continue
+        os.makedirs(os.path.join(FIXTURES_DIR, kind), exist_ok=True)
+        written[kind] = written.get(kind, 0) + 1
+        with open(os.path.join(FIXTURES_DIR, kind, f"{written[kind]:03d}.html"), "wb") as f:
+            f.write(zlib.decompress(body))
+    conn.close()
+    return written
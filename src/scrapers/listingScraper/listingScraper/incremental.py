@@ -0,0 +1,177 @@
+import os
+import sqlite3
+
+import scrapy
+
+
+def normalize_price(price):
+    # Spiders yield prices as strings ("12500"), the DB stores them as INTEGER
+    digits = "".join(ch for ch in str(price or "") if ch.isdigit())
+    return int(digits) if digits else -1
+
+
+class SeenListings:
+    """
+    Compact in-memory index of listings already stored for a source:
+    hash(link) -> last seen price. Hashing the link keeps the index to two
+    ints per listing instead of holding every URL string.
+    """
+
+    def __init__(self):
+        self.prices = {}
+
+    @classmethod
+    def from_db(cls, db_path):
+        index = cls()
+        if not os.path.exists(db_path):
+            return index
+
+        conn = sqlite3.connect(db_path)
+        try:
+            for link, price in conn.execute("SELECT link, price FROM cars"):
+                index.add(link, price)
+        except sqlite3.OperationalError:
+            pass  # DB exists but has no cars table yet
+        finally:
+            conn.close()
+        return index
+
+    def add(self, link, price):
+        self.prices[hash(link)] = normalize_price(price)
+
+    def status(self, link, price):
+        """Return "new", "changed" or "unchanged" for a scraped listing."""
+        known = self.prices.get(hash(link))
+        if known is None:
+            return "new"
+        if known != normalize_price(price):
+            return "changed"
+        return "unchanged"
+
+    def __len__(self):
+        return len(self.prices)
+
+
+class IncrementalSpiderMixin:
+    """
+    Adds an incremental (delta) crawl mode to a paginated listing spider.
+
+    Run with `scrapy crawl <name> -a incremental=1`. At start the spider loads
+    the links and prices already stored in `<db_source>.db` (same file the
+    SQLitePipeline writes), requests index pages one at a time instead of
+    queueing the whole range, skips listings whose price has not changed, and
+    stops paginating after the first page whose listings were all unchanged.
+
+    A page that fails (after retries) or has no listings at all (blocked, or
+    past the end) is logged and skipped rather than read as "caught up";
+    INCREMENTAL_MAX_MISSES such pages in a row stop the crawl. Why it
+    stopped is recorded in the incremental/stop_reason stat.
+
+    The page range can also be split across processes with
+    `-a shard=<i> -a num_shards=<n>`; each shard takes every n-th page
+    (see run_shards.py).
+
+    Spiders define `db_source`, `page_numbers` and `page_url_template`, an
+    index page URL with a `{page}` field.
+    INCREMENTAL_DB_DIR selects where the source DBs live (default: cwd).
+    """
+
+    db_source = None
+    page_numbers = range(0)
+    page_url_template = None
+
+    @classmethod
+    def page_url(cls, page):
+        return cls.page_url_template.format(page=page)
+
+    @property
+    def start_urls(self):
+        return [self.page_url(i) for i in self.shard_pages()]
+
+    @property
+    def is_incremental(self):
+        return str(getattr(self, "incremental", "")).lower() in ("1", "true", "yes")
+
+    @property
+    def is_sharded(self):
+        return int(getattr(self, "num_shards", 1)) > 1
+
+    def shard_pages(self):
+        # Interleave pages so every shard gets a mix of fresh and old listings
+        shard = int(getattr(self, "shard", 0))
+        num_shards = int(getattr(self, "num_shards", 1))
+        return list(self.page_numbers)[shard::num_shards]
+
+    async def start(self):
+        if not self.is_incremental:
+            async for item_or_request in super().start():
+                yield item_or_request
+            return
+
+        db_dir = self.settings.get("INCREMENTAL_DB_DIR", ".")
+        db_path = os.path.join(db_dir, f"{self.db_source}.db")
+        self.seen = SeenListings.from_db(db_path)
+        self.logger.info(f"Incremental mode: {len(self.seen)} known listings in {db_path}")
+        self.crawler.stats.set_value("incremental/known_listings", len(self.seen))
+
+        pages = self.shard_pages()
+        if pages:
+            yield self.page_request(pages, 0)
+
+    def page_request(self, pages, position, misses=0):
+        return scrapy.Request(
+            self.page_url(pages[position]),
+            callback=self.parse,
+            errback=self.page_failed,
+            meta={"incremental_pages": pages, "incremental_position": position, "incremental_misses": misses},
+        )
+
+    def page_failed(self, failure):
+        """Errback of index pages: log the failure and go on with the next page."""
+        request = failure.request
+        self.logger.warning(f"Index page {request.url} failed: {failure.getErrorMessage()}")
+        self.crawler.stats.inc_value("incremental/failed_pages")
+        return self.after_miss(request.meta)
+
+    def after_miss(self, meta):
+        misses = meta["incremental_misses"] + 1
+        if misses >= self.settings.getint("INCREMENTAL_MAX_MISSES", 5):
+            self.logger.warning(f"{misses} failed or empty index pages in a row, stopping pagination")
+            return self.stop_pagination(meta, "too_many_misses")
+        return self.following_page(meta, misses)
+
+    def following_page(self, meta, misses=0):
+        pages, position = meta["incremental_pages"], meta["incremental_position"]
+        if position + 1 >= len(pages):
+            return self.stop_pagination(meta, "last_page")
+        return self.page_request(pages, position + 1, misses)
+
+    def stop_pagination(self, meta, reason):
+        self.crawler.stats.set_value("incremental/stop_reason", reason)
+        self.crawler.stats.set_value("incremental/stopped_at_page", meta["incremental_pages"][meta["incremental_position"]])
+        return None
+
+    def listing_status(self, link, price):
+        """Classify a listing and count it; always "new" outside incremental mode."""
+        if not self.is_incremental:
+            return "new"
+        status = self.seen.status(link, price)
+        self.crawler.stats.inc_value(f"incremental/{status}")
+        return status
+
+    def next_incremental_page(self, response, listings, page_has_changes):
+        """
+        Request the next index page, or stop once a page's `listings` cards
+        were all known and unchanged. A page without cards is a miss.
+        """
+        if response.meta.get("incremental_pages") is None:
+            return None
+
+        if not listings:
+            self.logger.warning(f"No listings on {response.url}, skipping it")
+            self.crawler.stats.inc_value("incremental/empty_pages")
+            return self.after_miss(response.meta)
+        if not page_has_changes:
+            self.logger.info(f"No new or changed listings on {response.url}, stopping pagination")
+            return self.stop_pagination(response.meta, "caught_up")
+        return self.following_page(response.meta)
@@ -3,7 +3,16 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import json
+import sqlite3
+import time
+import zlib
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from twisted.internet import task
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
@@ -53,48 +62,368 @@ class ListingscraperSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
+class ResponseCacheStore:
+    """
+    Single-file SQLite store for downloaded pages, keyed by URL.
+    Bodies are zlib-compressed; headers are kept as JSON so a cached page can
+    be rebuilt into the same Response class Scrapy would have produced.
+    """
+
+    COMMIT_EVERY = 100
+
+    def __init__(self, path):
+        self.pending = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                spider TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL
+            )
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def get(self, url):
+        row = self.conn.execute(
+            "SELECT status, headers, body, etag, last_modified, fetched_at FROM responses WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, etag, last_modified, fetched_at = row
+        return {
+            "status": status,
+            "headers": json.loads(headers),
+            "body": zlib.decompress(body),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at,
+        }
+
+    def put(self, spider_name, response):
+        headers = {
+            k.decode("latin-1"): [v.decode("latin-1") for v in vs]
+            for k, vs in response.headers.items()
+        }
+        self.conn.execute(
+            """
+            INSERT INTO responses (url, spider, status, headers, body, etag, last_modified, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                spider = excluded.spider, status = excluded.status,
+                headers = excluded.headers, body = excluded.body,
+                etag = excluded.etag, last_modified = excluded.last_modified,
+                fetched_at = excluded.fetched_at
+            """,
+            (
+                response.url, spider_name, response.status, json.dumps(headers),
+                zlib.compress(response.body, 6),
+                response.headers.get("ETag", b"").decode("latin-1") or None,
+                response.headers.get("Last-Modified", b"").decode("latin-1") or None,
+                time.time(),
+            ),
+        )
+        self.pending += 1
+        if self.pending >= self.COMMIT_EVERY:
+            self.conn.commit()
+            self.pending = 0
+
+    def touch(self, url):
+        self.conn.execute("UPDATE responses SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+
 class ListingscraperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    """
+    Persistent response cache for the listing spiders.
+
+    Fresh entries (younger than the spider's TTL) are served without touching
+    the network. Stale entries are revalidated with If-None-Match /
+    If-Modified-Since, and a 304 is answered from the cache. In replay mode
+    every request is served from the cache and misses are dropped, so a
+    whole crawl can be re-parsed offline.
+
+    Settings:
+        LISTING_CACHE_ENABLED   turn the cache on (default False)
+        LISTING_CACHE_PATH      SQLite file holding the cache (default httpcache.db)
+        LISTING_CACHE_TTL       default freshness in seconds (default 3600)
+        LISTING_CACHE_TTLS      per-spider overrides, e.g. {"kijiji": 1800}
+        LISTING_CACHE_REPLAY    serve only from cache, never hit the network
+    """
+
+    def __init__(self, stats, path="httpcache.db", ttl=3600, ttls=None, replay=False):
+        self.stats = stats
+        self.path = path
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.replay = replay
+        self.store = None
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        settings = crawler.settings
+        if not settings.getbool("LISTING_CACHE_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            crawler.stats,
+            path=settings.get("LISTING_CACHE_PATH", "httpcache.db"),
+            ttl=settings.getint("LISTING_CACHE_TTL", 3600),
+            ttls=settings.getdict("LISTING_CACHE_TTLS"),
+            replay=settings.getbool("LISTING_CACHE_REPLAY"),
+        )
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        if request.method != "GET" or request.meta.get("cache_validating"):
+            return None
+
+        entry = self.store.get(request.url)
+        if entry is None:
+            self.count(spider, "miss")
+            if self.replay:
+                raise IgnoreRequest(f"Not in response cache (replay mode): {request.url}")
+            return None
+
+        age = time.time() - entry["fetched_at"]
+        if self.replay or age < self.ttls.get(spider.name, self.ttl):
+            self.count(spider, "hit")
+            return self.build_response(request, entry)
+
+        if not (entry["etag"] or entry["last_modified"]):
+            self.count(spider, "miss")
+            return None
+
+        # Stale but revalidatable: ask the server whether it changed
+        self.count(spider, "revalidate")
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        request.headers.update(headers)
+        request.meta["cache_validating"] = True
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        if request.method != "GET" or "cached" in response.flags:
+            return response
+
+        if response.status == 304 and request.meta.get("cache_validating"):
+            entry = self.store.get(request.url)
+            if entry is not None:
+                self.store.touch(request.url)
+                self.count(spider, "hit")
+                self.stats.inc_value("listing_cache/not_modified", spider=spider)
+                return self.build_response(request, entry)
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        if response.status == 200:
+            if request.meta.get("cache_validating"):
+                self.count(spider, "miss")
+            self.store.put(spider.name, response)
+            self.stats.inc_value("listing_cache/stored", spider=spider)
         return response
 
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+    def build_response(self, request, entry):
+        headers = Headers(entry["headers"])
+        respcls = responsetypes.from_args(headers=headers, url=request.url, body=entry["body"])
+        return respcls(
+            url=request.url,
+            status=entry["status"],
+            headers=headers,
+            body=entry["body"],
+            request=request,
+            flags=["cached"],
+        )
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def count(self, spider, outcome):
+        self.stats.inc_value(f"listing_cache/{outcome}", spider=spider)
+        hits = self.stats.get_value("listing_cache/hit", 0, spider=spider)
+        misses = self.stats.get_value("listing_cache/miss", 0, spider=spider)
+        if hits + misses:
+            self.stats.set_value("listing_cache/hit_ratio", round(hits / (hits + misses), 3), spider=spider)
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+        self.store = ResponseCacheStore(self.path)
+        if self.replay:
+            spider.logger.info(f"Response cache in replay mode: {self.path}")
+
+    def spider_closed(self, spider):
+        self.store.close()
+
+
+class DomainThrottleState:
+    """Running AIMD state and counters for one downloader slot (domain)."""
+
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latency = None
+        self.successes = 0
+        self.responses = 0
+        self.errors = 0
+        self.last_decrease = 0.0
+        self.slot = None  # downloader slot the values were last applied to
+
+
+class AdaptiveThrottleMiddleware:
+    """
+    Tunes concurrency and download delay per domain from what the site tells us,
+    instead of one static CONCURRENT_REQUESTS_PER_DOMAIN / DOWNLOAD_DELAY pair.
+
+    AIMD: every ADAPTIVE_THROTTLE_INCREASE_EVERY fast, successful responses add
+    one concurrent request and shave the delay; a 429/503 or a download error
+    halves concurrency and doubles the delay, at most once per cool-down window
+    so a burst of errors counts as a single congestion signal. Limits can be set
+    per spider, and a per-domain throughput line is logged every interval.
+
+    Settings:
+        ADAPTIVE_THROTTLE_ENABLED         turn the controller on
+        ADAPTIVE_THROTTLE_TARGET_LATENCY  latency (s) under which we speed up (default 2.0)
+        ADAPTIVE_THROTTLE_INCREASE_EVERY  successes per additive step (default 10)
+        ADAPTIVE_THROTTLE_LOG_INTERVAL    seconds between timeline lines (default 30)
+        ADAPTIVE_THROTTLE_LIMITS          per-spider {"min_concurrency", "max_concurrency",
+                                          "min_delay", "max_delay"} overrides
+        ADAPTIVE_THROTTLE_SHARDS          number of processes crawling the same domains;
+                                          ceilings and delays are split between them
+    """
+
+    BACKOFF_STATUSES = {429, 503}
+    DEFAULT_LIMITS = {
+        "min_concurrency": 1,
+        "max_concurrency": 8,
+        "min_delay": 0.0,
+        "max_delay": 60.0,
+    }
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.target_latency = settings.getfloat("ADAPTIVE_THROTTLE_TARGET_LATENCY", 2.0)
+        self.increase_every = settings.getint("ADAPTIVE_THROTTLE_INCREASE_EVERY", 10)
+        self.log_interval = settings.getfloat("ADAPTIVE_THROTTLE_LOG_INTERVAL", 30.0)
+        self.spider_limits = settings.getdict("ADAPTIVE_THROTTLE_LIMITS")
+        self.shards = max(settings.getint("ADAPTIVE_THROTTLE_SHARDS", 1), 1)
+        self.start_concurrency = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN", 2)
+        self.start_delay = settings.getfloat("DOWNLOAD_DELAY", 1.0)
+        self.domains = {}
+        self.log_task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_THROTTLE_ENABLED"):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        limits = {**self.DEFAULT_LIMITS, **self.spider_limits.get(spider.name, {})}
+        # Each shard gets its share of the site's budget so together they stay polite
+        limits["max_concurrency"] = max(limits["max_concurrency"] // self.shards, 1)
+        limits["min_delay"] = limits["min_delay"] * self.shards
+        limits["max_delay"] = limits["max_delay"] * self.shards
+        self.limits = limits
+        self.last_log = time.monotonic()
+        self.log_task = task.LoopingCall(self.log_timeline, spider)
+        self.log_task.start(self.log_interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.log_task and self.log_task.running:
+            self.log_task.stop()
+        self.log_timeline(spider)
+
+    def process_response(self, request, response, spider):
+        slot, state = self.get_slot(request)
+        if slot is None:
+            return response
+
+        state.responses += 1
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+
+        if response.status in self.BACKOFF_STATUSES:
+            self.stats.inc_value(f"adaptive_throttle/{request.meta['download_slot']}/backoff_status")
+            self.decrease(slot, state)
+        elif response.status < 400 and (state.latency or 0) <= self.target_latency:
+            state.successes += 1
+            if state.successes >= self.increase_every:
+                state.successes = 0
+                self.increase(slot, state)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        slot, state = self.get_slot(request)
+        if slot is not None:
+            state.errors += 1
+            self.stats.inc_value(f"adaptive_throttle/{request.meta['download_slot']}/errors")
+            self.decrease(slot, state)
+        return None
+
+    def get_slot(self, request):
+        key = request.meta.get("download_slot")
+        slot = self.crawler.engine.downloader.slots.get(key) if key else None
+        if slot is None:
+            return None, None
+        state = self.domains.get(key)
+        if state is None:
+            state = self.domains[key] = DomainThrottleState(self.start_concurrency, self.start_delay)
+        if state.slot is not slot:
+            # New key, or Scrapy garbage-collected the idle slot and made a
+            # fresh one with the default concurrency/delay: restore ours
+            self.apply(slot, state)
+        return slot, state
+
+    def increase(self, slot, state):
+        state.concurrency = min(state.concurrency + 1, self.limits["max_concurrency"])
+        state.delay = max(state.delay * 0.9, self.limits["min_delay"])
+        self.apply(slot, state)
+
+    def decrease(self, slot, state):
+        now = time.monotonic()
+        cooldown = max(state.latency or 0, state.delay, 1.0)
+        if now - state.last_decrease < cooldown:
+            return  # same congestion event
+        state.last_decrease = now
+        state.successes = 0
+        state.concurrency = max(state.concurrency // 2, self.limits["min_concurrency"])
+        state.delay = min(max(state.delay * 2, 0.25), self.limits["max_delay"])
+        self.apply(slot, state)
+
+    def apply(self, slot, state):
+        state.concurrency = min(max(state.concurrency, self.limits["min_concurrency"]), self.limits["max_concurrency"])
+        state.delay = min(max(state.delay, self.limits["min_delay"]), self.limits["max_delay"])
+        slot.concurrency = state.concurrency
+        slot.delay = state.delay
+        state.slot = slot
+
+    def log_timeline(self, spider):
+        now = time.monotonic()
+        elapsed = max(now - self.last_log, 1e-6)
+        self.last_log = now
+        for key, state in self.domains.items():
+            rate = state.responses / elapsed
+            spider.logger.info(
+                f"[throttle] {key}: {rate:.2f} resp/s, concurrency={state.concurrency}, "
+                f"delay={state.delay:.2f}s, latency={state.latency or 0:.2f}s, errors={state.errors}"
+            )
+            self.stats.max_value(f"adaptive_throttle/{key}/max_resp_per_sec", round(rate, 2))
+            self.stats.set_value(f"adaptive_throttle/{key}/concurrency", state.concurrency)
+            self.stats.set_value(f"adaptive_throttle/{key}/delay", round(state.delay, 2))
+            state.responses = 0
+            state.errors = 0
@@ -0,0 +1,378 @@
+"""
+Versioned schema for the listing DBs (kijiji.db, gratka.db, autotrader.pl.db
+and the merged polish_cars.db).
+
+Every DB's cars table is brought to the latest version by migrate(), which
+the scraper pipelines, run_shards.py and MergePLdb.py call on connect. The
+applied version is kept in PRAGMA user_version, so an up-to-date DB costs
+one pragma read.
+
+    1  cars rebuilt as a STRICT table; price, mileage and year converted
+       from the spiders' strings ("45 900 zł", "120,000") to integers
+    2  covering / partial indexes for the hot queries in HOT_QUERIES,
+       then ANALYZE
+    3  append-only price_history (listing id, epoch day, price), filled by
+       triggers on cars whenever a listing is inserted or re-priced, and
+       cleared when it is deleted, so a reused id (cars without
+       AUTOINCREMENT) does not inherit it
+
+Each migration names the hot queries it is responsible for. After it is
+applied their EXPLAIN QUERY PLAN is checked, and the migration is rolled
+back if any of them still scans cars or price_history.
+
+Usage (from src/scrapers/listingScraper):
+    python -m listingScraper.migrations ../../db/kijiji.db ../../db/polish_cars.db
+    python -m listingScraper.migrations --plans ../../db/kijiji.db
+"""
+
+import argparse
+import re
+import sqlite3
+
+CARS_COLUMNS = [
+    ("id", "INTEGER PRIMARY KEY"),
+    ("title", "TEXT"),
+    ("price", "INTEGER"),
+    ("currency", "TEXT"),
+    ("mileage", "INTEGER"),
+    ("mileage_unit", "TEXT"),
+    ("transmission", "TEXT"),
+    ("fuelType", "TEXT"),
+    ("source", "TEXT"),
+    ("link", "TEXT UNIQUE"),
+    ("year", "INTEGER"),
+    ("make", "TEXT"),
+    ("model", "TEXT"),
+    ("trim", "TEXT"),
+    ("manual_review", "INTEGER DEFAULT 0"),
+]
+INTEGER_COLUMNS = ("price", "mileage", "year", "manual_review")
+
+STRICT = sqlite3.sqlite_version_info >= (3, 37, 0)  # STRICT tables need SQLite 3.37
+
+# Days since 1970-01-01 (UTC), the price_history time unit
+EPOCH_DAY_SQL = "CAST(strftime('%s', 'now') AS INTEGER) / 86400"
+
+# Query shapes that run on every request or pipeline run,
+# with sample parameters for EXPLAIN QUERY PLAN
+HOT_QUERIES = {
+    # server.js /api/kijiji-cars
+    "kijiji_cars": ("""
+        SELECT id, make, model, year, price, mileage, link
+        FROM cars
+        WHERE length(model) > 0 AND price > 3000
+        ORDER BY price DESC
+    """, ()),
+    # server.js /api/polish-cars
+    "polish_cars": ("""
+        SELECT id, make, model, year, price, mileage, link
+        FROM cars
+        WHERE price > 3000
+        ORDER BY price DESC
+    """, ()),
+    # server.js /api/polish-cars/matching
+    "matching": ("""
+        SELECT id, make, model, year, price, mileage
+        FROM cars
+        WHERE make = ? AND model = ? AND year = ?
+        AND (? = 0 OR (mileage BETWEEN ? AND ?))
+        ORDER BY price ASC
+    """, ("BMW", "3 Series", 2018, 95000, 65000, 125000)),
+    # make_scatterplot.py
+    "scatterplot": ("SELECT make, model, year, mileage, price FROM cars WHERE make = ?", ("BMW",)),
+    # process_titles.py
+    "unparsed_titles": ("""
+        SELECT id, title, year
+        FROM cars
+        WHERE make IS NULL OR make = ''
+    """, ()),
+    # price_history.py largest_drops()
+    "price_drops": ("""
+        WITH recent AS (
+            -- The window is a thin slice of the history; without the hint the
+            -- planner may walk the whole table to get listing_id order for free
+            SELECT listing_id, min(day) AS first_day, max(day) AS last_day
+            FROM price_history INDEXED BY price_history_day
+            WHERE day >= ?
+            GROUP BY listing_id
+        ),
+        changes AS MATERIALIZED (
+            SELECT r.listing_id, r.last_day,
+                COALESCE(
+                    (SELECT p.price FROM price_history AS p
+                     WHERE p.listing_id = r.listing_id AND p.day < r.first_day
+                     ORDER BY p.day DESC LIMIT 1),
+                    (SELECT p.price FROM price_history AS p
+                     WHERE p.listing_id = r.listing_id AND p.day = r.first_day)
+                ) AS was_price,
+                (SELECT p.price FROM price_history AS p
+                 WHERE p.listing_id = r.listing_id AND p.day = r.last_day) AS price
+            FROM recent AS r
+        )
+        SELECT c.id, c.make, c.model, c.year, c.mileage, c.link,
+               ch.was_price, ch.price, ch.was_price - ch.price AS price_drop,
+               round(100.0 * (ch.was_price - ch.price) / ch.was_price, 2) AS drop_pct,
+               ch.last_day
+        FROM changes AS ch
+        JOIN cars AS c ON c.id = ch.listing_id
+        WHERE ch.price < ch.was_price
+        ORDER BY price_drop DESC
+        LIMIT ?
+    """, (20000, 50)),
+    # price_history.py days_on_market()
+    "days_on_market": ("""
+        SELECT c.id, c.make, c.model, c.year, c.mileage, c.price, c.link,
+               ? - (SELECT min(h.day) FROM price_history AS h WHERE h.listing_id = c.id) AS days_on_market,
+               (SELECT count(*) - 1 FROM price_history AS h WHERE h.listing_id = c.id) AS price_changes
+        FROM cars AS c
+        WHERE c.make = ? AND c.model = ?
+        ORDER BY days_on_market DESC
+    """, (20000, "BMW", "3 Series")),
+}
+CHECKED_TABLES = ("cars", "price_history")
+
+# "FROM cars AS c", "JOIN price_history h": EXPLAIN QUERY PLAN names a
+# table by its alias when it has one ("SCAN c")
+TABLE_ALIAS = re.compile(
+    r"\b(?:FROM|JOIN)\s+(?:main\.)?(%s)\b(?:\s+(?:AS\s+)?(?!(?:INDEXED|NOT|WHERE|ON|USING|JOIN|LEFT|INNER|CROSS|"
+    r"NATURAL|GROUP|ORDER|LIMIT|UNION|WINDOW)\b)(\w+))?" % "|".join(CHECKED_TABLES),
+    re.IGNORECASE,
+)
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    def __init__(self, version, name, apply, checks=()):
+        self.version = version
+        self.name = name
+        self.apply = apply
+        self.checks = list(checks)  # HOT_QUERIES that must not do full scans afterwards
+
+
+def parse_int(value):
+    """
+    Integer from a scraped number: 12500, "12500", "45 900 zł", "120,000 km".
+    A trailing decimal part ("45 900,00") is dropped; None if there are no digits.
+    """
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return round(value)
+    text = re.sub(r"[^\d.,]", "", str(value))
+    text = re.sub(r"[.,]\d{1,2}$", "", text)
+    digits = re.sub(r"\D", "", text)
+    return int(digits) if digits else None
+
+
+def cars_table_sql(name, autoincrement=False, extra_columns=()):
+    columns = [
+        f'"{col}" {"INTEGER PRIMARY KEY AUTOINCREMENT" if col == "id" and autoincrement else decl}'
+        for col, decl in CARS_COLUMNS
+    ]
+    # Columns added by hand outside this schema keep their values untyped
+    columns += [f'"{col}" ANY' if STRICT else f'"{col}"' for col in extra_columns]
+    body = ",\n        ".join(columns)
+    return f"CREATE TABLE {name} (\n        {body}\n    ){' STRICT' if STRICT else ''}"
+
+
+def table_sql(conn, name):
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def strict_cars(conn, autoincrement=False):
+    """Create cars, or rebuild it as STRICT with integer price/mileage/year."""
+    old_sql = table_sql(conn, "cars")
+    if old_sql is None:
+        conn.execute(cars_table_sql("cars", autoincrement))
+        return
+
+    existing = [row[1] for row in conn.execute("PRAGMA table_info(cars)")]
+    known = [col for col, _ in CARS_COLUMNS if col in existing]
+    extra = [col for col in existing if col not in dict(CARS_COLUMNS)]
+    # Keep AUTOINCREMENT (polish_cars.db) so merged ids are never reused
+    conn.execute(cars_table_sql("cars_new", "AUTOINCREMENT" in old_sql.upper(), extra))
+
+    select = [f'parse_int("{col}")' if col in INTEGER_COLUMNS else f'"{col}"' for col in known + extra]
+    conn.execute(f"""
+        INSERT INTO cars_new ({", ".join(f'"{col}"' for col in known + extra)})
+        SELECT {", ".join(select)} FROM cars
+    """)
+    conn.execute("DROP TABLE cars")
+    conn.execute("ALTER TABLE cars_new RENAME TO cars")
+
+
+def hot_query_indexes(conn, autoincrement=False):
+    # Partial + covering: the price-ranked /api/*-cars lists are read
+    # straight from the index, in order, without touching the table
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS cars_price_listing
+        ON cars (price DESC, make, model, year, mileage, link)
+        WHERE price > 3000
+    """)
+    # Equality prefix for matching and the scatterplot, covering both
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS cars_make_model_year
+        ON cars (make, model, year, mileage, price)
+    """)
+    # Only rows process_titles.py has not parsed yet, so it stays small
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS cars_unparsed
+        ON cars (make, title, year)
+        WHERE make IS NULL OR make = ''
+    """)
+    conn.execute("ANALYZE")
+
+
+def price_history(conn, autoincrement=False):
+    """
+    One row per (listing, day) on which the listing's price changed,
+    clustered by listing so a listing's history is one contiguous range.
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS price_history (
+            listing_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            PRIMARY KEY (listing_id, day)
+        ) {'STRICT, ' if STRICT else ''}WITHOUT ROWID
+    """)
+    # (day, listing_id): the recent-changes range scan of largest_drops()
+    conn.execute("CREATE INDEX IF NOT EXISTS price_history_day ON price_history (day)")
+
+    # Every writer (pipelines, run_shards.py, MergePLdb.py) goes through
+    # these; a second change on the same day keeps that day's last price.
+    # An upsert rather than INSERT OR REPLACE: the writers' own ON CONFLICT
+    # clause would override a trigger's OR REPLACE
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cars_price_insert
+        AFTER INSERT ON cars WHEN new.price IS NOT NULL
+        BEGIN
+            INSERT INTO price_history (listing_id, day, price)
+            VALUES (new.id, {EPOCH_DAY_SQL}, new.price)
+            ON CONFLICT(listing_id, day) DO UPDATE SET price = excluded.price;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cars_price_update
+        AFTER UPDATE OF price ON cars WHEN new.price IS NOT NULL AND new.price IS NOT old.price
+        BEGIN
+            INSERT INTO price_history (listing_id, day, price)
+            VALUES (new.id, {EPOCH_DAY_SQL}, new.price)
+            ON CONFLICT(listing_id, day) DO UPDATE SET price = excluded.price;
+        END
+    """)
+    # process_titles.py deletes unparsable rows; their history goes with them
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS cars_price_delete
+        AFTER DELETE ON cars
+        BEGIN
+            DELETE FROM price_history WHERE listing_id = old.id;
+        END
+    """)
+
+    # Listings already stored start their history today
+    conn.execute(f"""
+        INSERT OR IGNORE INTO price_history (listing_id, day, price)
+        SELECT id, {EPOCH_DAY_SQL}, price FROM cars WHERE price IS NOT NULL
+    """)
+    conn.execute("ANALYZE price_history")
+
+
+MIGRATIONS = [
+    Migration(1, "strict cars table", strict_cars),
+    Migration(2, "hot query indexes", hot_query_indexes,
+              checks=["kijiji_cars", "polish_cars", "matching", "scatterplot", "unparsed_titles"]),
+    Migration(3, "price history", price_history, checks=["price_drops", "days_on_market"]),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def query_plan(conn, sql, params=()):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def checked_names(sql):
+    """CHECKED_TABLES plus the aliases sql gives them."""
+    names = set(CHECKED_TABLES)
+    names.update(alias for _, alias in TABLE_ALIAS.findall(sql) if alias)
+    return names
+
+
+def full_scans(conn, sql, params=()):
+    """Plan steps that read a whole CHECKED_TABLES table (an index scan is fine)."""
+    names = checked_names(sql)
+    return [
+        step for step in query_plan(conn, sql, params)
+        if step.split()[0] == "SCAN" and step.split()[1] in names and "INDEX" not in step
+    ]
+
+
+def check_plans(conn, names):
+    failures = {name: full_scans(conn, *HOT_QUERIES[name]) for name in names}
+    failures = {name: steps for name, steps in failures.items() if steps}
+    if failures:
+        raise MigrationError("full table scans left: " + "; ".join(
+            f"{name}: {', '.join(steps)}" for name, steps in failures.items()
+        ))
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, autoincrement=False):
+    """
+    Apply pending migrations, each in its own transaction with its plan
+    checks. autoincrement only matters when cars does not exist yet.
+    Returns the list of versions applied.
+    """
+    if schema_version(conn) >= LATEST_VERSION:
+        return []
+
+    conn.create_function("parse_int", 1, parse_int, deterministic=True)
+    applied = []
+    for migration in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock: another process may have migrated
+            if schema_version(conn) >= migration.version:
+                conn.rollback()
+                continue
+            migration.apply(conn, autoincrement)
+            check_plans(conn, migration.checks)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise MigrationError(f"migration {migration.version} ({migration.name}) failed: {e}") from e
+        applied.append(migration.version)
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate listing DBs to the latest cars schema")
+    parser.add_argument("dbs", nargs="+", help="SQLite files to migrate")
+    parser.add_argument("--plans", action="store_true", help="print the hot queries' plans")
+    args = parser.parse_args()
+
+    for db in args.dbs:
+        conn = sqlite3.connect(db)
+        before = schema_version(conn)
+        applied = migrate(conn)
+        if not applied:
+            conn.execute("ANALYZE")  # refresh the planner's stats as the table grows
+            conn.commit()
+        print(f"{db}: version {before} -> {schema_version(conn)}"
+              + (f" (applied {', '.join(map(str, applied))})" if applied else ", up to date"))
+        if args.plans:
+            for name, (sql, params) in HOT_QUERIES.items():
+                print(f"  {name}: {' | '.join(query_plan(conn, sql, params))}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Precompiled selectors for the listing spiders.
+
+Every XPath/CSS query the spiders run per page or per card is compiled once
+at import time into an lxml XPath object and evaluated directly on the lxml
+tree behind the Scrapy response (response.selector.root), skipping the
+parsel Selector wrapping for each intermediate result.
+"""
+
+import re
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+_css_translator = HTMLTranslator()
+
+
+def xpath(query):
+    return etree.XPath(query)
+
+
+def css(query):
+    # Same translation parsel applies to response.css(), including ::text / ::attr()
+    return etree.XPath(_css_translator.css_to_xpath(query))
+
+
+def first(values, default=""):
+    return str(values[0]) if values else default
+
+
+def re_first(regex, values):
+    # Mirrors parsel's SelectorList.re_first(): first match across all values
+    for value in values:
+        match = regex.search(value)
+        if match:
+            return match.group(1) if regex.groups else match.group(0)
+    return None
+
+
+# ============================
+# Kijiji
+# ============================
+KIJIJI_LISTINGS = xpath('//*[@id="base-layout-main-wrapper"]/div[4]/div[1]/div[2]/div[3]/ul/li')
+KIJIJI_TITLE = xpath(".//h3/a/text()")
+KIJIJI_LINK = xpath(".//h3/a/@href")
+KIJIJI_PRICE = xpath(".//section/div[1]/div[2]/div[1]/div[1]/div/p/text()")
+KIJIJI_FEATURES = xpath('.//div[contains(@class,"ffNurV")]/div/p/text()')
+KIJIJI_NEXT_PAGE = css('li[data-testid="pagination-next-link"] a::attr(href)')
+
+KIJIJI_TRANSMISSIONS = frozenset(["automatic", "manual", "cvt"])  # extend as needed
+KIJIJI_FUELS = frozenset(["gas", "diesel", "electric", "hybrid"])
+
+
+def kijiji_card_fields(card):
+    """Extract the raw fields of one Kijiji result card."""
+    mileage = ""
+    transmission = ""
+    fuel_type = ""
+
+    # A feature text is either a mileage, a transmission or a fuel type;
+    # the last one of each kind wins, as in the original loop
+    for f in KIJIJI_FEATURES(card):
+        f = f.strip()
+        f_lower = f.lower()
+        if "km" in f_lower or "miles" in f_lower:
+            mileage = f
+        elif f_lower in KIJIJI_TRANSMISSIONS:
+            transmission = f
+        elif f_lower in KIJIJI_FUELS:
+            fuel_type = f
+
+    return {
+        "title": first(KIJIJI_TITLE(card)).strip(),
+        "price": first(KIJIJI_PRICE(card)).strip(),
+        "link": first(KIJIJI_LINK(card)).strip(),
+        "mileage": mileage,
+        "transmission": transmission,
+        "fuelType": fuel_type,
+    }
+
+
+# ============================
+# Gratka
+# ============================
+GRATKA_LISTINGS = xpath('//div[@class="listing__teaserWrapper"]')
+GRATKA_TITLE = xpath('.//h2[@class="teaserUnified__title"]/text()')
+GRATKA_PRICE = xpath('.//p[@class="teaserUnified__price"]/text()')
+GRATKA_LINK = xpath('.//a[@class="teaserLink"]/@href')
+GRATKA_MILEAGE = xpath('.//li[contains(text(), "Przebieg")]/text()')
+GRATKA_LOCATION = xpath('.//span[@class="teaserUnified__location"]/text()')
+
+GRATKA_YEAR = xpath('//li[span[contains(text(),"Rok produkcji")]]/b/text()')
+GRATKA_FUEL = xpath('//li[span[contains(text(),"Rodzaj paliwa")]]/b/text()')
+GRATKA_TRANSMISSION = xpath('//li[span[contains(text(),"Skrzynia biegów")]]/b/text()')
+
+
+def gratka_card_fields(card):
+    """Extract the raw fields of one Gratka index teaser."""
+    links = GRATKA_LINK(card)
+    return {
+        "title": first(GRATKA_TITLE(card)).strip(),
+        "price": first(GRATKA_PRICE(card)).strip(),
+        "link": str(links[0]) if links else None,
+        "mileage": first(GRATKA_MILEAGE(card)),
+        "location": first(GRATKA_LOCATION(card)).strip(),
+    }
+
+
+def gratka_detail_fields(root):
+    """Extract year, fuel type and transmission from a Gratka detail page."""
+    return {
+        "year": first(GRATKA_YEAR(root)).strip(),
+        "fuelType": first(GRATKA_FUEL(root)).strip(),
+        "transmission": first(GRATKA_TRANSMISSION(root)).strip(),
+    }
+
+
+# ============================
+# Autotrader.pl
+# ============================
+AUTOTRADER_LISTINGS = css("div.offer-card")
+AUTOTRADER_TITLE = css("h2::text")
+AUTOTRADER_DETAILS = css("div.offer-card__basic p::text")
+AUTOTRADER_PRICE = css("div.offer-card__price strong::text")
+AUTOTRADER_LINK = css("a::attr(href)")
+AUTOTRADER_YEAR = css("div.offer-card__details span[title]::attr(title)")
+AUTOTRADER_DETAIL_TEXT = css("div.offer-card__details span.offer-detail::text")
+AUTOTRADER_REGION = css("span.offer-detail--city::attr(title)")
+
+YEAR_RE = re.compile(r"\d{4}")
+MILEAGE_RE = re.compile(r"[\d\s]+ km")
+FUEL_RE = re.compile(r"(benzyna|diesel|hybryda|elektryczny)")
+
+
+def autotrader_card_fields(card):
+    """Extract the raw fields of one Autotrader.pl offer card."""
+    # Evaluated once and shared by the mileage and fuel type regexes
+    detail_text = AUTOTRADER_DETAIL_TEXT(card)
+    return {
+        "title": first(AUTOTRADER_TITLE(card)).strip(),
+        "details": first(AUTOTRADER_DETAILS(card)).strip(),
+        "price": first(AUTOTRADER_PRICE(card)).strip(),
+        "link": first(AUTOTRADER_LINK(card)).strip(),
+        "year": re_first(YEAR_RE, AUTOTRADER_YEAR(card)),
+        "mileage": re_first(MILEAGE_RE, detail_text),
+        "fuelType": re_first(FUEL_RE, detail_text),
+        "region": first(AUTOTRADER_REGION(card)),
+    }
@@ -1,7 +1,45 @@
 import sqlite3
 import os
+import queue
+import threading
+import time
+from collections import deque
+
+from twisted.internet import task
+from twisted.internet.defer import Deferred
+
+from .migrations import migrate, parse_int
+
+UPSERT_CAR = """
+    INSERT INTO cars (
+        link, title, price, currency, mileage, mileage_unit,
+        transmission, fuelType, source, year, make, model, trim, manual_review
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(link) DO UPDATE SET
+        price = excluded.price
+    WHERE excluded.price != cars.price
+"""
+
+
+def item_to_row(item):
+    # Column order matches UPSERT_CAR; cars is STRICT, so numbers are parsed here
+    return (
+        item['link'], item['title'], parse_int(item['price']), item['currency'],
+        parse_int(item['mileage']), item['mileage_unit'], item['transmission'], item['fuelType'],
+        item['source'], parse_int(item['year']), item['make'], item['model'], item['trim'],
+        item['manual_review']
+    )
+
 
 class SQLitePipeline:
+    db_dir = "."
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        pipeline.db_dir = crawler.settings.get("SQLITE_DB_DIR", ".")
+        return pipeline
+
     def open_spider(self, spider):
         # Keep a dictionary of connections per source
         self.connections = {}
@@ -12,32 +50,16 @@ class SQLitePipeline:
         for conn in self.connections.values():
             conn.close()
 
+    def connect(self, db_name):
+        return sqlite3.connect(db_name)
+
     def get_connection(self, source):
-        # Return a connection for a given source, creating DB/table if needed
+        # Return a connection for a given source, creating/migrating the DB if needed
         if source not in self.connections:
-            db_name = f"{source}.db"
-            conn = sqlite3.connect(db_name)
+            db_name = os.path.join(self.db_dir, f"{source}.db")
+            conn = self.connect(db_name)
+            migrate(conn)
             cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS cars (
-                    id INTEGER PRIMARY KEY,
-                    title TEXT,
-                    price INTEGER,
-                    currency TEXT,
-                    mileage INTEGER,
-                    mileage_unit TEXT,
-                    transmission TEXT,
-                    fuelType TEXT,
-                    source TEXT,
-                    link TEXT UNIQUE,
-                    year INTEGER,
-                    make TEXT,
-                    model TEXT,
-                    trim TEXT,
-                    manual_review INTEGER DEFAULT 0
-                )
-            ''')
-            conn.commit()
             self.connections[source] = conn
             self.cursors[source] = cursor
         return self.connections[source], self.cursors[source]
@@ -45,19 +67,251 @@ class SQLitePipeline:
     def process_item(self, item, spider):
         conn, cursor = self.get_connection(item['source'])
 
-        cursor.execute("""
-            INSERT INTO cars (
-                link, title, price, currency, mileage, mileage_unit,
-                transmission, fuelType, source, year, make, model, trim, manual_review
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(link) DO UPDATE SET
-                price = excluded.price
-            WHERE excluded.price != cars.price
-        """, (
-            item['link'], item['title'], item['price'], item['currency'],
-            item['mileage'], item['mileage_unit'], item['transmission'], item['fuelType'],
-            item['source'], item['year'], item['make'], item['model'], item['trim'],
-            item['manual_review']
-        ))
+        cursor.execute(UPSERT_CAR, item_to_row(item))
         conn.commit()
         return item
+
+
+class BufferedSQLitePipeline(SQLitePipeline):
+    """
+    Buffers items per source DB and writes them with a single executemany
+    per transaction once SQLITE_BATCH_SIZE items are queued or
+    SQLITE_FLUSH_INTERVAL seconds have passed since the last flush. A timer
+    flushes every SQLITE_FLUSH_INTERVAL too, so the tail of a burst is not
+    left in memory until the next item arrives.
+    Connections are opened in WAL mode so a flush costs one fsync, not one per item.
+
+    Settings:
+        SQLITE_BATCH_SIZE       items per source before a flush (default 500)
+        SQLITE_FLUSH_INTERVAL   max seconds between flushes (default 5.0)
+        SQLITE_SYNCHRONOUS      PRAGMA synchronous value (default NORMAL)
+        SQLITE_CACHE_SIZE       PRAGMA cache_size value (default -64000, i.e. 64 MB)
+    """
+
+    def __init__(self, stats=None, batch_size=500, flush_interval=5.0,
+                 synchronous="NORMAL", cache_size=-64000):
+        self.stats = stats
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            stats=crawler.stats,
+            batch_size=settings.getint("SQLITE_BATCH_SIZE", 500),
+            flush_interval=settings.getfloat("SQLITE_FLUSH_INTERVAL", 5.0),
+            synchronous=settings.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+            cache_size=settings.getint("SQLITE_CACHE_SIZE", -64000),
+        )
+        pipeline.db_dir = settings.get("SQLITE_DB_DIR", ".")
+        return pipeline
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        self.buffers = {}
+        self.items_written = 0
+        self.started_at = time.monotonic()
+        self.last_flush = self.started_at
+        self.flush_timer = self.start_flush_timer()
+
+    def start_flush_timer(self):
+        timer = task.LoopingCall(self.flush_all)
+        timer.start(self.flush_interval, now=False)
+        return timer
+
+    def close_spider(self, spider):
+        if self.flush_timer is not None and self.flush_timer.running:
+            self.flush_timer.stop()
+        self.flush_all()
+        super().close_spider(spider)
+
+    def connect(self, db_name):
+        conn = sqlite3.connect(db_name)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        return conn
+
+    def process_item(self, item, spider):
+        source = item['source']
+        buffer = self.buffers.setdefault(source, [])
+        buffer.append(item_to_row(item))
+
+        if len(buffer) >= self.batch_size:
+            self.flush(source)
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush_all()
+        return item
+
+    def flush_all(self):
+        for source in list(self.buffers):
+            self.flush(source)
+        self.last_flush = time.monotonic()
+
+    def flush(self, source):
+        rows = self.buffers.get(source)
+        if not rows:
+            return
+
+        conn, cursor = self.get_connection(source)
+        start = time.perf_counter()
+        with conn:  # one transaction per batch
+            cursor.executemany(UPSERT_CAR, rows)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        self.items_written += len(rows)
+        self.buffers[source] = []
+        self.record_flush(source, len(rows), latency_ms)
+
+    def record_flush(self, source, count, latency_ms):
+        if self.stats is None:
+            return
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        self.stats.inc_value("sqlite/flushes")
+        self.stats.inc_value(f"sqlite/{source}/items_written", count)
+        self.stats.set_value("sqlite/items_written", self.items_written)
+        self.stats.set_value("sqlite/items_per_sec", round(self.items_written / elapsed, 2))
+        self.stats.set_value("sqlite/last_flush_latency_ms", round(latency_ms, 2))
+        self.stats.max_value("sqlite/max_flush_latency_ms", round(latency_ms, 2))
+
+
+class ThreadedSQLitePipeline(BufferedSQLitePipeline):
+    """
+    Same batching and upsert rules as BufferedSQLitePipeline, but all sqlite3
+    calls run on a dedicated writer thread so the reactor never blocks on disk.
+    Items are handed over through a bounded queue; when it is full,
+    process_item parks the row with a Deferred that the writer fires (via
+    reactor.callFromThread) once it has moved the row into the queue, which
+    holds the engine back instead of growing memory. No thread waits on a
+    full queue, so the reactor's threadpool (DNS resolution) is never tied up.
+
+    Extra settings:
+        SQLITE_QUEUE_SIZE   max rows waiting for the writer (default 5000)
+    """
+
+    STOP = object()
+
+    def __init__(self, queue_size=5000, **kwargs):
+        super().__init__(**kwargs)
+        self.queue_size = queue_size
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            queue_size=settings.getint("SQLITE_QUEUE_SIZE", 5000),
+            stats=crawler.stats,
+            batch_size=settings.getint("SQLITE_BATCH_SIZE", 500),
+            flush_interval=settings.getfloat("SQLITE_FLUSH_INTERVAL", 5.0),
+            synchronous=settings.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+            cache_size=settings.getint("SQLITE_CACHE_SIZE", -64000),
+        )
+        pipeline.db_dir = settings.get("SQLITE_DB_DIR", ".")
+        return pipeline
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        # Imported here, not at module level, so Scrapy can install its reactor first
+        from twisted.internet import reactor
+
+        self.reactor = reactor
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.waiting = deque()  # (Deferred, entry) parked while the queue is full
+        self.waiting_lock = threading.Lock()
+        self.writer_error = None
+        self.writer = threading.Thread(
+            target=self.run_writer, name="sqlite-writer", daemon=True
+        )
+        self.writer.start()
+
+    def start_flush_timer(self):
+        return None  # the writer thread owns the buffers and flushes on its get() timeout
+
+    def close_spider(self, spider):
+        # The writer flushes what is left and closes its own connections
+        self.queue.put(self.STOP)
+        self.writer.join()
+        if self.writer_error is not None:
+            spider.logger.error(f"SQLite writer failed: {self.writer_error}")
+
+    def process_item(self, item, spider):
+        if self.writer_error is not None:
+            raise self.writer_error
+
+        entry = (item['source'], item_to_row(item))
+        with self.waiting_lock:
+            # Rows already parked go first, so the queue keeps item order
+            if not self.waiting:
+                try:
+                    self.queue.put_nowait(entry)
+                    entry = None
+                except queue.Full:
+                    pass
+            if entry is not None:
+                # Backpressure: the writer admits the row and fires d once there is room
+                d = Deferred()
+                self.waiting.append((d, entry))
+        if self.stats is not None:
+            self.stats.max_value("sqlite/max_queue_depth", self.queue.qsize())
+        if entry is None:
+            return item
+        if self.stats is not None:
+            self.stats.inc_value("sqlite/queue_full_waits")
+        d.addCallback(lambda _: item)
+        return d
+
+    def admit_waiting(self):
+        """Writer thread: move parked rows into the queue while it has room."""
+        with self.waiting_lock:
+            while self.waiting:
+                d, entry = self.waiting[0]
+                try:
+                    self.queue.put_nowait(entry)
+                except queue.Full:
+                    break
+                self.waiting.popleft()
+                self.reactor.callFromThread(d.callback, None)
+
+    def fail_waiting(self, error):
+        with self.waiting_lock:
+            while self.waiting:
+                d, _ = self.waiting.popleft()
+                self.reactor.callFromThread(d.errback, error)
+
+    def run_writer(self):
+        try:
+            while True:
+                try:
+                    entry = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    self.flush_all()
+                    continue
+                self.admit_waiting()
+                if entry is self.STOP:
+                    break
+
+                source, row = entry
+                buffer = self.buffers.setdefault(source, [])
+                buffer.append(row)
+
+                if len(buffer) >= self.batch_size:
+                    self.flush(source)
+                if time.monotonic() - self.last_flush >= self.flush_interval:
+                    self.flush_all()
+            self.flush_all()
+        except Exception as e:
+            self.writer_error = e
+            self.fail_waiting(e)
+            # Keep draining so close_spider's STOP gets through
+            while self.queue.get() is not self.STOP:
+                pass
+        finally:
+            SQLitePipeline.close_spider(self, None)
+
+    def record_flush(self, source, count, latency_ms):
+        super().record_flush(source, count, latency_ms)
+        if self.stats is not None:
+            self.stats.set_value("sqlite/queue_depth", self.queue.qsize())
@@ -61,9 +61,31 @@ DEFAULT_REQUEST_HEADERS = {
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "listingScraper.middlewares.ListingscraperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "listingScraper.middlewares.ListingscraperDownloaderMiddleware": 543,
+    "listingScraper.middlewares.AdaptiveThrottleMiddleware": 545,
+}
+
+# Adaptive per-domain throttle (AIMD). CONCURRENT_REQUESTS_PER_DOMAIN and
+# DOWNLOAD_DELAY above are only the starting point for each domain.
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_TARGET_LATENCY = 2.0
+ADAPTIVE_THROTTLE_INCREASE_EVERY = 10
+ADAPTIVE_THROTTLE_LOG_INTERVAL = 30
+ADAPTIVE_THROTTLE_SHARDS = 1
+ADAPTIVE_THROTTLE_LIMITS = {
+    "kijiji": {"min_concurrency": 1, "max_concurrency": 6, "min_delay": 0.25, "max_delay": 30},
+    "gratka": {"min_concurrency": 1, "max_concurrency": 8, "min_delay": 0.1, "max_delay": 30},
+    "autoTraderPL": {"min_concurrency": 1, "max_concurrency": 4, "min_delay": 0.5, "max_delay": 60},
+}
+
+# Persistent response cache (see ListingscraperDownloaderMiddleware).
+# Replay mode re-parses a cached crawl offline: LISTING_CACHE_REPLAY = True
+LISTING_CACHE_ENABLED = False
+LISTING_CACHE_PATH = "httpcache.db"
+LISTING_CACHE_TTL = 3600
+LISTING_CACHE_TTLS = {}
+LISTING_CACHE_REPLAY = False
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -77,9 +99,28 @@ ITEM_PIPELINES = {
    "listingScraper.pipelines.SQLitePipeline": 300,
 }
 
+# Buffered pipeline: swap in "listingScraper.pipelines.BufferedSQLitePipeline"
+# above to batch inserts per source DB (one transaction per flush, WAL mode)
+SQLITE_BATCH_SIZE = 500
+SQLITE_FLUSH_INTERVAL = 5.0
+SQLITE_SYNCHRONOUS = "NORMAL"
+SQLITE_CACHE_SIZE = -64000  # negative = KiB, so 64 MB page cache
+# Threaded pipeline: "listingScraper.pipelines.ThreadedSQLitePipeline" moves all
+# sqlite3 calls off the reactor; producers wait once this many rows are queued
+SQLITE_QUEUE_SIZE = 5000
+# Directory the pipelines write <source>.db into (run_shards.py sets one per shard)
+SQLITE_DB_DIR = "."
+
+# Incremental crawls (`scrapy crawl kijiji -a incremental=1`) read known links
+# and prices from <source>.db in this directory
+INCREMENTAL_DB_DIR = "."
+# Failed or empty index pages in a row after which an incremental crawl stops
+INCREMENTAL_MAX_MISSES = 5
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-AUTOTHROTTLE_ENABLED = True
+# (kept off while AdaptiveThrottleMiddleware manages the download slots)
+AUTOTHROTTLE_ENABLED = False
 # The initial download delay
 AUTOTHROTTLE_START_DELAY = 1
 # The maximum download delay to be set in case of high latencies
@@ -1,8 +1,11 @@
 import scrapy
 from datetime import datetime
 
+from listingScraper.incremental import IncrementalSpiderMixin
+from listingScraper import parsing
 
-class AutotraderplSpider(scrapy.Spider):
+
+class AutotraderplSpider(IncrementalSpiderMixin, scrapy.Spider):
 
     """
     The following class scrapes car listings from Autotrader.pl.
@@ -12,34 +15,39 @@ class AutotraderplSpider(scrapy.Spider):
     
     name = "autoTraderPL"
     allowed_domains = ["autotrader.pl", "www.autotrader.pl"]
-    start_urls = [
-        f"https://www.autotrader.pl/szukaj/osobowe/str-{i}?nowe=nie"
-        for i in range(2, 333)  # Example: pages 1–2
-    ]# MAX PAGE = 333
+    db_source = "autotrader.pl"
+    page_numbers = range(2, 333)  # MAX PAGE = 333
+    page_url_template = "https://www.autotrader.pl/szukaj/osobowe/str-{page}?nowe=nie"
 
     def parse(self, response):
         """Parse search result pages and extract listings"""
 
-        listings = response.css("div.offer-card")
+        listings = parsing.AUTOTRADER_LISTINGS(response.selector.root)
         self.logger.info(f"Found {len(listings)} listings on {response.url}")
+        page_has_changes = False
 
         for listing in listings:
             try:
-                title = listing.css("h2::text").get(default="").strip()
-                details = listing.css("div.offer-card__basic p::text").get(default="").strip()
+                fields = parsing.autotrader_card_fields(listing)
+                title = fields["title"]
+                details = fields["details"]
 
-                price = listing.css("div.offer-card__price strong::text").get(default="").strip()
-                link = listing.css("a::attr(href)").get(default="").strip()
+                price = fields["price"]
+                link = fields["link"]
 
                 # footer details
-                year = listing.css("div.offer-card__details span[title]::attr(title)").re_first(r"\d{4}")
-                mileage = listing.css("div.offer-card__details span.offer-detail::text").re_first(r"[\d\s]+ km")
-                fuel_type = listing.css("div.offer-card__details span.offer-detail::text").re_first(r"(benzyna|diesel|hybryda|elektryczny)")
+                year = fields["year"]
+                mileage = fields["mileage"]
+                fuel_type = fields["fuelType"]
 
                 # clean fields
                 clean_price = price.replace("PLN", "").replace(" ", "").strip() if price else "0"
                 mileage_number = "".join(filter(str.isdigit, mileage)) if mileage else "0"
 
+                if self.listing_status(response.urljoin(link), clean_price) == "unchanged":
+                    continue
+                page_has_changes = True
+
                 yield {
                     "title": title,
                     "make": title.split()[0] if title else "",
@@ -50,7 +58,7 @@ class AutotraderplSpider(scrapy.Spider):
                     "currency": "PLN",
                     "mileage": mileage_number,
                     "mileage_unit": "km",
-                    "region": listing.css("span.offer-detail--city::attr(title)").get(default=""),
+                    "region": fields["region"],
                     "transmission": "",  # Not present in snippet
                     "fuelType": fuel_type,
                     "source": "autotrader.pl",
@@ -60,3 +68,7 @@ class AutotraderplSpider(scrapy.Spider):
                 }
             except Exception as e:
                 self.logger.error(f"Error parsing listing: {e}")
+
+        next_request = self.next_incremental_page(response, len(listings), page_has_changes)
+        if next_request:
+            yield next_request
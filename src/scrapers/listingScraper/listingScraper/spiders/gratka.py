@@ -1,8 +1,11 @@
 import scrapy
 from datetime import datetime
 
+from listingScraper.incremental import IncrementalSpiderMixin
+from listingScraper import parsing
 
-class GratkaSpider(scrapy.Spider):
+
+class GratkaSpider(IncrementalSpiderMixin, scrapy.Spider):
     """
     
     The following class scrapes car listings from Gratka.pl.
@@ -13,27 +16,33 @@ class GratkaSpider(scrapy.Spider):
     
     name = "gratka"
     allowed_domains = ["gratka.pl", "www.gratka.pl"]
-    start_urls = [
-        f"https://gratka.pl/motoryzacja?page={i}"
-        for i in range(1, 313)  # scrape pages 1 and 2
-    ]
+    db_source = "gratka"
+    page_numbers = range(1, 313)  # scrape pages 1 and 2
+    page_url_template = "https://gratka.pl/motoryzacja?page={page}"
 
     def parse(self, response):
         """Parse listing (index) pages and follow links to details"""
         self.logger.info(f"Response status: {response.status}")
 
-        listings = response.xpath('//div[@class="listing__teaserWrapper"]')
+        listings = parsing.GRATKA_LISTINGS(response.selector.root)
+        page_has_changes = False
 
         for listing in listings:
-            title = listing.xpath('.//h2[@class="teaserUnified__title"]/text()').get(default="").strip()
-            price = listing.xpath('.//p[@class="teaserUnified__price"]/text()').get(default="").strip()
-            link = listing.xpath('.//a[@class="teaserLink"]/@href').get()
-            mileage = listing.xpath('.//li[contains(text(), "Przebieg")]/text()').get(default="")
-            location = listing.xpath('.//span[@class="teaserUnified__location"]/text()').get(default="").strip()
+            fields = parsing.gratka_card_fields(listing)
+            title = fields["title"]
+            price = fields["price"]
+            link = fields["link"]
+            mileage = fields["mileage"]
+            location = fields["location"]
 
             clean_price = price.replace("$", "").replace(",", "").strip() if price else "0"
             mileage_number = ''.join(filter(str.isdigit, mileage)) if mileage else "0"
 
+            # known listing at the same price: no need to fetch its detail page
+            if self.listing_status(response.urljoin(link), clean_price) == "unchanged":
+                continue
+            page_has_changes = True
+
             # send partial data + link to detail page
             yield scrapy.Request(
                 response.urljoin(link),
@@ -46,6 +55,10 @@ class GratkaSpider(scrapy.Spider):
                 },
             )
 
+        next_request = self.next_incremental_page(response, len(listings), page_has_changes)
+        if next_request:
+            yield next_request
+
     def parse_detail(self, response):
         """Parse detail page for missing fields like year, fuel type, etc."""
         title = response.meta["title"]
@@ -53,9 +66,10 @@ class GratkaSpider(scrapy.Spider):
         mileage = response.meta["mileage"]
         location = response.meta["location"]
 
-        year = response.xpath('//li[span[contains(text(),"Rok produkcji")]]/b/text()').get(default="").strip()
-        fuelType = response.xpath('//li[span[contains(text(),"Rodzaj paliwa")]]/b/text()').get(default="").strip()
-        transmission = response.xpath('//li[span[contains(text(),"Skrzynia biegów")]]/b/text()').get(default="").strip()
+        fields = parsing.gratka_detail_fields(response.selector.root)
+        year = fields["year"]
+        fuelType = fields["fuelType"]
+        transmission = fields["transmission"]
         #vin = response.xpath('//li[span[contains(text(),"Numer VIN")]]/b/text()').get(default="").strip()
 
         yield {
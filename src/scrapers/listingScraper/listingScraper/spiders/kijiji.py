@@ -1,8 +1,11 @@
 import scrapy
 from datetime import datetime
 
+from listingScraper.incremental import IncrementalSpiderMixin
+from listingScraper import parsing
 
-class KijijiSpider(scrapy.Spider):
+
+class KijijiSpider(IncrementalSpiderMixin, scrapy.Spider):
     """ 
     The following class scrapes car listings from Kijiji.ca for Quebec region. 
     It extracts details such as title, price, mileage, transmission, fuel type, and link to the listing.
@@ -10,10 +13,9 @@ class KijijiSpider(scrapy.Spider):
 
     name = "kijiji"
     allowed_domains = ["kijiji.ca"]
-    start_urls = [
-        f"https://www.kijiji.ca/b-autos-camions/quebec/page-{i}/c174l9001?view=list"
-        for i in range(1, 474)  # scrape pages 1 to 5
-    ]
+    db_source = "kijiji"
+    page_numbers = range(1, 474)  # scrape pages 1 to 5
+    page_url_template = "https://www.kijiji.ca/b-autos-camions/quebec/page-{page}/c174l9001?view=list"
 
     def parse(self, response):
         """
@@ -22,35 +24,28 @@ class KijijiSpider(scrapy.Spider):
         
         self.logger.info(f"Response status: {response.status}")
         
-        listings = response.xpath('//*[@id="base-layout-main-wrapper"]/div[4]/div[1]/div[2]/div[3]/ul/li')
+        root = response.selector.root
+        listings = parsing.KIJIJI_LISTINGS(root)
+        page_has_changes = False
 
         for listing in listings:
             try:
-                title = listing.xpath(".//h3/a/text()").get(default="").strip()
-                price = listing.xpath('.//section/div[1]/div[2]/div[1]/div[1]/div/p/text()').get(default="").strip()
-                link = listing.xpath(".//h3/a/@href").get(default="").strip()
-
-                features = listing.xpath('.//div[contains(@class,"ffNurV")]/div/p/text()').getall()
-                features = [f.strip() for f in features]
-
-                mileage = ""
-                transmission = ""
-                fuelType = ""
-
-                for f in features:
-                    f_lower = f.lower()
-                    if "km" in f_lower or "miles" in f_lower:
-                        mileage = f
-                    elif f_lower in ["automatic", "manual", "cvt"]:  # extend as needed
-                        transmission = f
-                    elif f_lower in ["gas", "diesel", "electric", "hybrid"]:
-                        fuelType = f
-
+                fields = parsing.kijiji_card_fields(listing)
+                title = fields["title"]
+                price = fields["price"]
+                link = fields["link"]
+                mileage = fields["mileage"]
+                transmission = fields["transmission"]
+                fuelType = fields["fuelType"]
 
                 clean_price = price.replace("$", "").replace(",", "").strip() if price else "0"
                 mileage_number = ''.join(filter(str.isdigit, mileage)) if mileage else "0"
                 mileage_unit = "km" if "km" in mileage else "miles" if mileage and "miles" in mileage else ""
 
+                if self.listing_status(response.urljoin(link), clean_price) == "unchanged":
+                    continue
+                page_has_changes = True
+
                 yield {
                     'title': title,
                     'make': '',
@@ -73,7 +68,16 @@ class KijijiSpider(scrapy.Spider):
                     self.logger.error(f"Error parsing listing: {e}")
     
 
-        next_page = response.css('li[data-testid="pagination-next-link"] a::attr(href)').get()
+        if self.is_incremental:
+            next_request = self.next_incremental_page(response, len(listings), page_has_changes)
+            if next_request:
+                yield next_request
+            return
+
+        if self.is_sharded:
+            return  # other shards own the remaining pages
+
+        next_page = parsing.first(parsing.KIJIJI_NEXT_PAGE(root), None)
         self.logger.info(f"Next page URL: {next_page}")
 
         if next_page:
@@ -0,0 +1,113 @@
+"""
+Sharded crawl runner.
+
+Splits each spider's page range into N shards, runs every shard as its own
+`scrapy crawl` process (so XPath parsing uses all cores), and merges the
+per-shard SQLite outputs into the usual <source>.db files at the end.
+
+Per-domain politeness is kept by splitting each site's concurrency ceiling
+and delay between the shards that crawl it (ADAPTIVE_THROTTLE_SHARDS).
+
+Usage:
+    python run_shards.py kijiji gratka autoTraderPL --shards 4
+    python run_shards.py kijiji --shards 8 --workers 4 --incremental
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from listingScraper.migrations import migrate
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+COLUMNS = "link, title, price, currency, mileage, mileage_unit, transmission, fuelType, source, year, make, model, trim, manual_review"
+
+
+def run_shard(spider, shard, num_shards, shard_dir, incremental, output_dir):
+    os.makedirs(shard_dir, exist_ok=True)
+    cmd = [
+        sys.executable, "-m", "scrapy", "crawl", spider,
+        "-a", f"shard={shard}",
+        "-a", f"num_shards={num_shards}",
+        "-s", f"SQLITE_DB_DIR={shard_dir}",
+        "-s", f"ADAPTIVE_THROTTLE_SHARDS={num_shards}",
+        "-s", f"LOG_FILE={os.path.join(shard_dir, 'crawl.log')}",
+    ]
+    if incremental:
+        # Every shard reads the merged DBs from the last run
+        cmd += ["-a", "incremental=1", "-s", f"INCREMENTAL_DB_DIR={output_dir}"]
+
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=PROJECT_DIR)
+    elapsed = time.perf_counter() - start
+    print(f"{spider} shard {shard + 1}/{num_shards} finished in {elapsed:.1f}s (exit {result.returncode})")
+    return result.returncode
+
+
+def merge_shard_dbs(shard_root, output_dir):
+    """Upsert every shard's <source>.db into output_dir/<source>.db."""
+    merged = {}
+    for shard_db in sorted(glob.glob(os.path.join(shard_root, "*", "*.db"))):
+        source = os.path.basename(shard_db)
+        out_path = os.path.join(output_dir, source)
+
+        conn = sqlite3.connect(out_path)
+        migrate(conn)
+        conn.execute("ATTACH DATABASE ? AS shard", (shard_db,))
+        with conn:
+            # Same rule as the pipeline: existing listings only take a new price
+            cur = conn.execute(f"""
+                INSERT INTO cars ({COLUMNS})
+                SELECT {COLUMNS} FROM shard.cars WHERE true
+                ON CONFLICT(link) DO UPDATE SET
+                    price = excluded.price
+                WHERE excluded.price != cars.price
+            """)
+            merged[source] = merged.get(source, 0) + cur.rowcount
+        conn.execute("DETACH DATABASE shard")
+        conn.close()
+
+    for source, count in merged.items():
+        print(f"Merged {count} rows into {os.path.join(output_dir, source)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run spiders as parallel page-range shards")
+    parser.add_argument("spiders", nargs="+", help="spider names, e.g. kijiji gratka autoTraderPL")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="shards per spider")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes running at once")
+    parser.add_argument("--output-dir", default=PROJECT_DIR, help="where the merged <source>.db files go")
+    parser.add_argument("--incremental", action="store_true", help="run shards in incremental mode")
+    parser.add_argument("--keep-shards", action="store_true", help="keep per-shard DBs and logs")
+    args = parser.parse_args()
+
+    shard_root = os.path.join(args.output_dir, "shards")
+    jobs = [
+        (spider, shard, args.shards, os.path.join(shard_root, f"{spider}-{shard}"), args.incremental, args.output_dir)
+        for spider in args.spiders
+        for shard in range(args.shards)
+    ]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        exit_codes = list(pool.map(lambda job: run_shard(*job), jobs))
+    print(f"Crawled {len(jobs)} shards in {time.perf_counter() - start:.1f}s")
+
+    merge_shard_dbs(shard_root, args.output_dir)
+
+    failed = sum(1 for code in exit_codes if code != 0)
+    if failed:
+        print(f"{failed} shard(s) exited with errors, see {shard_root}/*/crawl.log")
+    elif not args.keep_shards:
+        shutil.rmtree(shard_root, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
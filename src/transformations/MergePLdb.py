@@ -1,64 +1,133 @@
 # transformations/merge_databases.py
 import sqlite3
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scrapers", "listingScraper"))
+from listingScraper.migrations import migrate
 
 DBS = [
-    r"src\db\gratka.db",
-    r"src\db\autotrader.pl.db",
+    os.environ.get("GRATKA_DB", r"src\db\gratka.db"),
+    os.environ.get("AUTOTRADER_DB", r"src\db\autotrader.pl.db"),
 ]
 
-MERGED_DB = r"src\db\polish_cars.db"
+MERGED_DB = os.environ.get("POLISH_DB", r"src\db\polish_cars.db")
+
+COLUMNS = "title, price, currency, mileage, mileage_unit, transmission, fuelType, source, link, year, make, model, trim, manual_review"
+# Compared and copied on already-merged rows; link is the conflict key
+UPDATED = [c for c in COLUMNS.split(", ") if c != "link"]
+
+
+def row(prefix):
+    return "(" + ", ".join(f"{prefix}{c}" for c in UPDATED) + ")"
+
+
+def merge_dbs(dbs, output_db, rebuild=False):
+    """
+    Incrementally merge source DBs into output_db.
+
+    Each source is ATTACHed and merged set-based, writing only what changed:
+
+        new rows      rows past the stored high-water mark (max source id
+                      already merged) are inserted; a link already merged
+                      takes the row's values
+        changed rows  already-merged rows whose columns differ from the
+                      source (re-priced, normalized, re-parsed) are updated
+        deletions     merged links no source has any more are deleted
 
-def merge_dbs(dbs, output_db):
-    if os.path.exists(output_db):
+    The high-water mark is kept with the link stored at that id. If the
+    source no longer has that link there (the DB was recreated or its ids
+    were reused), the mark is dropped and every source row is compared.
+    The merged DB and its derived tables (filtered_models, ...) are kept;
+    pass rebuild=True to start from an empty file as before.
+    """
+    missing = [db for db in dbs if not os.path.exists(db)]
+    if missing:
+        # An empty stand-in would read as "every listing was deleted"
+        raise FileNotFoundError(f"source DB(s) not found: {', '.join(missing)}")
+
+    if rebuild and os.path.exists(output_db):
         os.remove(output_db)
 
     out_conn = sqlite3.connect(output_db)
     out_cur = out_conn.cursor()
 
-    # Create unified schema
+    # Unified schema, same versions as the source DBs (see listingScraper/migrations.py)
+    migrate(out_conn, autoincrement=True)
     out_cur.execute("""
-        CREATE TABLE IF NOT EXISTS cars (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            price INTEGER,
-            currency TEXT,
-            mileage INTEGER,
-            mileage_unit TEXT,
-            transmission TEXT,
-            fuelType TEXT,
-            source TEXT,
-            link TEXT UNIQUE,
-            year INTEGER,
-            make TEXT,
-            model TEXT,
-            trim TEXT,
-            manual_review INTEGER DEFAULT 0
+        CREATE TABLE IF NOT EXISTS merge_state (
+            source_db TEXT PRIMARY KEY,
+            max_id INTEGER,
+            max_link TEXT,
+            merged_at TEXT
         )
     """)
+    # Links of every source, for the deletion pass
+    out_cur.execute("CREATE TEMP TABLE source_links (link TEXT PRIMARY KEY) WITHOUT ROWID")
+    out_conn.commit()
 
     for db in dbs:
-        in_conn = sqlite3.connect(db)
-        in_cur = in_conn.cursor()
+        key = os.path.basename(db)
+        state = out_cur.execute("SELECT max_id, max_link FROM merge_state WHERE source_db = ?", (key,)).fetchone()
 
-        in_cur.execute("SELECT title, price, currency, mileage, mileage_unit, transmission, fuelType, source, link, year, make, model, trim, manual_review FROM cars")
-        rows = in_cur.fetchall()
+        # Sources must be typed too, or the STRICT insert rejects their raw prices
+        src_conn = sqlite3.connect(db)
+        migrate(src_conn)
+        src_conn.close()
 
-        for row in rows:
-            try:
-                out_cur.execute("""
-                    INSERT OR IGNORE INTO cars
-                    (title, price, currency, mileage, mileage_unit, transmission, fuelType, source, link, year, make, model, trim, manual_review)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, row)
-            except Exception as e:
-                print(f"Error inserting row from {db}: {e}")
+        out_cur.execute("ATTACH DATABASE ? AS src", (db,))
+        try:
+            high_water = 0
+            if state is not None:
+                at_mark = out_cur.execute("SELECT link FROM src.cars WHERE id = ?", (state[0],)).fetchone()
+                if at_mark is not None and at_mark[0] == state[1]:
+                    high_water = state[0]
+                else:
+                    print(f"{db}: link at id {state[0]} changed, source was recreated; comparing all rows")
 
-        in_conn.close()
+            with out_conn:
+                # New rows since the last merge
+                out_cur.execute(f"""
+                    INSERT INTO cars ({COLUMNS})
+                    SELECT {COLUMNS} FROM src.cars WHERE id > ? ORDER BY id
+                    ON CONFLICT(link) DO UPDATE SET {row("")} = {row("excluded.")}
+                    WHERE {row("cars.")} IS NOT {row("excluded.")}
+                """, (high_water,))
+                inserted = out_cur.rowcount
 
-    out_conn.commit()
+                # Already-merged rows changed in the source since (re-crawled
+                # prices, translatePLdb.py normalization, process fixes)
+                out_cur.execute(f"""
+                    UPDATE cars SET {row("")} = {row("s.")}
+                    FROM src.cars AS s
+                    WHERE s.link = cars.link AND s.id <= ? AND {row("cars.")} IS NOT {row("s.")}
+                """, (high_water,))
+                changed = out_cur.rowcount
+
+                out_cur.execute("INSERT OR IGNORE INTO source_links SELECT link FROM src.cars WHERE link IS NOT NULL")
+                out_cur.execute("""
+                    INSERT INTO merge_state (source_db, max_id, max_link, merged_at)
+                    SELECT ?, id, link, datetime('now') FROM src.cars WHERE id = (SELECT MAX(id) FROM src.cars)
+                    ON CONFLICT(source_db) DO UPDATE SET
+                        max_id = excluded.max_id, max_link = excluded.max_link, merged_at = excluded.merged_at
+                """, (key,))
+            print(f"{db}: {inserted} new/updated rows past id {high_water}, {changed} changed")
+        except Exception as e:
+            print(f"Error merging {db}: {e}")
+            raise
+        finally:
+            out_cur.execute("DETACH DATABASE src")
+
+    # Only reached when every source merged, so a failed source deletes nothing
+    with out_conn:
+        out_cur.execute("""
+            DELETE FROM cars
+            WHERE link IS NOT NULL AND NOT EXISTS (SELECT 1 FROM source_links AS l WHERE l.link = cars.link)
+        """)
+        deleted = out_cur.rowcount
     out_conn.close()
-    print(f"Merged {len(dbs)} DBs into {output_db}")
+    print(f"Merged {len(dbs)} DBs into {output_db} ({deleted} listings gone from the sources deleted)")
+
 
 if __name__ == "__main__":
     merge_dbs(DBS, MERGED_DB)
@@ -0,0 +1,268 @@
+"""
+Cross-market comparables: Polish listings comparable to each Kijiji listing.
+
+Same rule as the dashboard and /api/polish-cars/matching (same make,
+model and year, mileage within +-30,000 km, or any mileage when the
+Kijiji listing has none), but computed for every Kijiji listing in one
+pass instead of one HTTP call or array scan per car.
+
+ComparableIndex sorts the Polish listings by (make, model, year) key and
+mileage into flat NumPy arrays, so each key owns a contiguous,
+mileage-sorted slice of prices and a mileage band is two binary searches.
+Polish models come from fuzzy_match_models.py's filtered_models table
+(already mapped to Kijiji model names) when it exists, else from cars.
+
+Where the result differs from the dashboard's own matching
+(KijijiCarsList.tsx over /api/polish-cars):
+
+    - make and model are compared after normalize_name() (case, accents,
+      punctuation), the dashboard compares the raw strings
+    - Polish models are filtered_models' matched_model, so "Serie 3"
+      can match "3 Series"; the dashboard only sees cars.model
+    - Kijiji mileage stored in miles is converted to km before the band
+    - a Kijiji listing without mileage is compared with the whole
+      make/model/year group, as /api/polish-cars/matching does; the
+      dashboard finds no comparables for it
+
+Both keep only Polish listings priced over MIN_PRICE with a positive
+mileage, the /api/polish-cars floor plus the dashboard's mileage > 0.
+
+Writes one row per Kijiji listing to kijiji.db's comparables table.
+
+Usage (from the repo root):
+    python src/transformations/comparables.py
+    python src/transformations/comparables.py --band 20000
+"""
+
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+KIJIJI_DB = os.environ.get("KIJIJI_DB", r"src\db\kijiji.db")
+POLISH_DB = os.environ.get("POLISH_DB", r"src\db\polish_cars.db")
+MILEAGE_BAND = 30000  # km either side, as in the dashboard
+MIN_PRICE = 3000  # same floor as the /api/*-cars routes
+QUANTILES = (0.25, 0.5, 0.75)
+MILES_TO_KM = 1.609344
+
+STATS_BLOCK = 10000  # listings per band_stats() call, bounds the gathered price array
+
+# Keys are spread this far apart in the combined sort value, far above any mileage
+KEY_STRIDE = 1 << 32
+
+
+def normalize_name(value):
+    """Match key for makes and models: ASCII, lowercase, punctuation folded to spaces."""
+    if not isinstance(value, str):
+        return ""
+    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", value).split())
+
+
+def normalize_column(values):
+    # Normalize each distinct value once; listings repeat a few hundred names
+    return values.map({v: normalize_name(v) for v in values.dropna().unique()}).fillna("").astype(str)
+
+
+def listing_keys(df):
+    """(normalized make, normalized model, year) key column for a frame of listings."""
+    year = pd.to_numeric(df["year"], errors="coerce")
+    make = normalize_column(df["make"])
+    model = normalize_column(df["model"])
+    keys = make + "|" + model + "|" + year.round().astype("Int64").astype(str)
+    return keys.where(year.notna() & (make != "") & (model != ""))
+
+
+class ComparableIndex:
+    """
+    Polish prices grouped by (make, model, year), each group sorted by mileage.
+
+    All groups live in three flat arrays (mileages, prices, and a combined
+    key_code * KEY_STRIDE + mileage sort value); self.keys maps a key to
+    its code and self.bounds[code] is the group's [start, end) slice.
+    """
+
+    def __init__(self, df):
+        df = df.assign(key=listing_keys(df), mileage=pd.to_numeric(df["mileage"], errors="coerce"),
+                       price=pd.to_numeric(df["price"], errors="coerce"))
+        df = df[df["key"].notna() & (df["mileage"] > 0) & (df["price"] > MIN_PRICE)]
+
+        codes, uniques = pd.factorize(df["key"], sort=True)
+        order = np.lexsort((df["mileage"].to_numpy(), codes))
+        self.codes = codes[order].astype(np.int64)
+        self.mileages = df["mileage"].to_numpy(dtype=np.float64)[order]
+        self.prices = df["price"].to_numpy(dtype=np.float64)[order]
+        self.sort_values = self.codes * KEY_STRIDE + self.mileages.astype(np.int64)
+
+        self.keys = {key: code for code, key in enumerate(uniques)}
+        counts = np.bincount(self.codes, minlength=len(uniques))
+        ends = np.cumsum(counts)
+        self.bounds = np.column_stack([ends - counts, ends])
+
+    def __len__(self):
+        return len(self.prices)
+
+    def group(self, make, model, year):
+        """Mileage-sorted (mileages, prices) arrays of one key (empty if unknown)."""
+        code = self.keys.get(f"{normalize_name(make)}|{normalize_name(model)}|{int(year)}")
+        if code is None:
+            return self.mileages[:0], self.prices[:0]
+        start, end = self.bounds[code]
+        return self.mileages[start:end], self.prices[start:end]
+
+    def comparables(self, make, model, year, mileage=None, band=MILEAGE_BAND):
+        """Prices of one listing's comparables."""
+        mileages, prices = self.group(make, model, year)
+        if not mileage:
+            return prices
+        lo = np.searchsorted(mileages, mileage - band, side="left")
+        hi = np.searchsorted(mileages, mileage + band, side="right")
+        return prices[lo:hi]
+
+    def band_stats(self, starts, counts):
+        """
+        Mean and QUANTILES of prices[start:start + count] for many bands at once.
+
+        All bands' prices are gathered into one array, sorted by (band, price)
+        with a single sort on band * stride + price, and the quantiles read
+        off with numpy's default linear interpolation.
+        """
+        offsets = np.cumsum(counts) - counts
+        band = np.repeat(np.arange(len(counts), dtype=np.float64), counts)
+        positions = np.arange(counts.sum()) - np.repeat(offsets, counts) + np.repeat(starts, counts)
+        stride = self.prices.max() + 1
+        prices = band * stride + self.prices[positions]
+        prices.sort()
+        prices -= band * stride
+
+        out = np.empty((len(counts), 1 + len(QUANTILES)))
+        out[:, 0] = np.add.reduceat(prices, offsets) / counts
+        for j, q in enumerate(QUANTILES, start=1):
+            h = (counts - 1) * q
+            below = np.floor(h).astype(np.int64)
+            above = np.minimum(below + 1, counts - 1)
+            lower = prices[offsets + below]
+            out[:, j] = lower + (h - below) * (prices[offsets + above] - lower)
+        return out
+
+    def match(self, df, band=MILEAGE_BAND):
+        """
+        Comparable stats for every listing in df (make, model, year, mileage).
+        Returns a frame aligned on df's index with count, mean and quantile prices.
+        """
+        codes = listing_keys(df).map(self.keys).to_numpy(dtype=np.float64)
+        found = ~np.isnan(codes)
+        codes = np.where(found, codes, 0).astype(np.int64)
+        mileage = pd.to_numeric(df["mileage"], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+        # Two vectorized binary searches over the combined (key, mileage) order
+        # give every listing's band; no mileage means the key's whole slice
+        base = codes * KEY_STRIDE
+        lo = np.searchsorted(self.sort_values, base + np.maximum(mileage - band, 0).astype(np.int64), side="left")
+        hi = np.searchsorted(self.sort_values, base + (mileage + band).astype(np.int64), side="right")
+        no_mileage = mileage <= 0
+        lo = np.where(no_mileage, self.bounds[codes, 0] if len(self.bounds) else 0, lo)
+        hi = np.where(no_mileage, self.bounds[codes, 1] if len(self.bounds) else 0, hi)
+        counts = np.where(found, hi - lo, 0)
+
+        stats = np.full((len(df), 1 + len(QUANTILES)), np.nan)
+        rows = np.flatnonzero(counts)
+        for block in np.array_split(rows, max(1, -(-len(rows) // STATS_BLOCK))):
+            if len(block):
+                stats[block] = self.band_stats(lo[block], counts[block])
+
+        result = pd.DataFrame(stats, index=df.index,
+                              columns=["mean_price"] + [f"p{int(q * 100)}_price" for q in QUANTILES])
+        result.insert(0, "comparables", counts)
+        return result.rename(columns={"p50_price": "median_price"})
+
+
+def load_polish(db_path=POLISH_DB):
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql("SELECT make, matched_model AS model, year, mileage, price FROM filtered_models", conn)
+        source = "filtered_models"
+    except Exception:
+        df = pd.read_sql("SELECT make, model, year, mileage, price FROM cars", conn)
+        source = "cars"
+    conn.close()
+    print(f"Loaded {len(df)} Polish listings from {source}")
+    return df
+
+
+def load_kijiji(db_path=KIJIJI_DB):
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql("""
+        SELECT id, make, model, year, mileage, mileage_unit, price, link
+        FROM cars
+        WHERE length(model) > 0
+    """, conn)
+    conn.close()
+    mileage = pd.to_numeric(df["mileage"], errors="coerce")
+    df["mileage"] = mileage.where(df["mileage_unit"] != "miles", mileage * MILES_TO_KM)
+    return df
+
+
+def write_comparables(db_path, ids, result):
+    conn = sqlite3.connect(db_path)
+    matched_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS comparables")
+        conn.execute("""
+            CREATE TABLE comparables (
+                id INTEGER PRIMARY KEY,
+                comparables INTEGER,
+                mean_price REAL,
+                p25_price REAL,
+                median_price REAL,
+                p75_price REAL,
+                matched_at TEXT
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO comparables VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (int(i), int(r.comparables),
+                 *(None if np.isnan(v) else round(float(v), 2)
+                   for v in (r.mean_price, r.p25_price, r.median_price, r.p75_price)),
+                 matched_at)
+                for i, r in zip(ids, result.itertuples(index=False))
+            ],
+        )
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match every Kijiji listing to comparable Polish listings")
+    parser.add_argument("--kijiji-db", default=KIJIJI_DB)
+    parser.add_argument("--polish-db", default=POLISH_DB)
+    parser.add_argument("--band", type=int, default=MILEAGE_BAND, help="mileage window in km either side")
+    args = parser.parse_args()
+
+    polish = load_polish(args.polish_db)
+    kijiji = load_kijiji(args.kijiji_db)
+
+    start = time.perf_counter()
+    index = ComparableIndex(polish)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = index.match(kijiji, args.band)
+    matched = time.perf_counter() - start
+
+    write_comparables(args.kijiji_db, kijiji["id"], result)
+    with_comps = int((result["comparables"] > 0).sum())
+    print(f"Index: {len(index)} Polish listings in {len(index.keys)} (make, model, year) keys, built in {built:.3f}s")
+    print(f"Matched {len(kijiji)} Kijiji listings in {matched:.3f}s "
+          f"({len(kijiji) / matched if matched else 0:.0f} listings/s), {with_comps} with comparables")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Cost-scenario sweep over the materialized opportunities.
+
+Evaluates every listing's profit under a grid of cost assumptions
+(CAD->PLN rate, shipping quote, customs / VAT rates, engine class for
+excise) with NumPy broadcasting over listings x scenarios, and reports how
+robust each opportunity is: profit percentiles across scenarios and the
+share of scenarios in which it is profitable.
+
+Duty depends on the vehicle as well as the scenario:
+    excise  - EXCISE_RATES by fuel type (electric, hybrid, other) and by
+              the scenario's engine class (engine size isn't scraped)
+    customs - historic_customs_rate for cars HISTORIC_AGE years or older,
+              customs_rate otherwise
+
+Costs are computed with opportunities.landed_costs, but the opportunities
+table charges one flat set of costs (COSTS: 10% customs at any age, 18.6%
+excise for any fuel). Only the scenario with COSTS' values, the large engine
+class and --historic-customs equal to the customs rate reproduces its
+profit, and then only for cars that are neither hybrid nor electric: those
+always pay their own excise rates here. The default grid also charges
+historic cars 0% customs and includes small engines (3.1% excise), so its
+figures differ from the table for those listings.
+
+Usage (from the repo root, after opportunities.py):
+    python src/transformations/cost_scenarios.py
+    python src/transformations/cost_scenarios.py --fx 2.4:2.9:50 --shipping 9000:21000:25 --write
+    python src/transformations/cost_scenarios.py --historic-customs 0 0.1
+"""
+
+import argparse
+import datetime
+import itertools
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from opportunities import COSTS, landed_costs
+
+KIJIJI_DB = os.environ.get("KIJIJI_DB", r"src\db\kijiji.db")
+
+# (engine <= 2.0 L, engine > 2.0 L); same 3.1% / 18.6% as the dashboard
+EXCISE_RATES = {
+    "other": (0.031, 0.186),
+    "hybrid": (0.0155, 0.093),
+    "electric": (0.0, 0.0),
+}
+FUEL_CLASSES = list(EXCISE_RATES)
+ENGINE_CLASSES = ("small", "large")
+HISTORIC_AGE = 30
+
+DEFAULT_GRID = {
+    "cad_to_pln": np.linspace(2.45, 2.80, 15),
+    "shipping": np.linspace(10000, 20000, 11),
+    "customs_rate": [COSTS["customs_rate"]],
+    "historic_customs_rate": [0.0],
+    "vat_rate": [COSTS["vat_rate"]],
+    "engine": list(ENGINE_CLASSES),
+}
+
+PERCENTILES = (10, 50, 90)
+BLOCK_ELEMENTS = 250_000  # listing x scenario cells per block, sized to stay in cache
+
+
+def scenario_table(grid=DEFAULT_GRID):
+    """Cartesian product of the grid's values, one row per scenario."""
+    names = list(grid)
+    return pd.DataFrame(list(itertools.product(*(grid[n] for n in names))), columns=names)
+
+
+def fuel_class(fuel):
+    fuel = fuel.fillna("").str.lower()
+    return np.select(
+        [fuel.str.contains("electric"), fuel.str.contains("hybrid")],
+        [FUEL_CLASSES.index("electric"), FUEL_CLASSES.index("hybrid")],
+        FUEL_CLASSES.index("other"),
+    )
+
+
+def load_listings(db_path=KIJIJI_DB, min_matches=1):
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql("""
+        SELECT o.id, o.make, o.model, o.year, o.price, o.avg_polish_price, o.comparables, c.fuelType
+        FROM opportunities AS o
+        JOIN cars AS c ON c.id = o.id
+        WHERE o.comparables >= ?
+    """, conn, params=[min_matches])
+    conn.close()
+    return df
+
+
+def sweep(listings, scenarios):
+    """
+    Profit of every listing under every scenario, summarised per listing.
+
+    Total cost is affine in the listing price: price * A + B, where A and B
+    only depend on the scenario and the listing's duty class (fuel class x
+    historic). landed_costs() is evaluated once on that small
+    (class, scenario) grid, leaving one multiply-add per listing x scenario.
+    Listings are processed in blocks of about BLOCK_ELEMENTS cells.
+    """
+    s = {name: scenarios[name].to_numpy() for name in scenarios.columns if name != "engine"}
+    engine = (scenarios["engine"].to_numpy() == "large").astype(np.int64)
+
+    # (fuel class, historic, scenario) grids, flattened to (class, scenario)
+    excise = np.array([[EXCISE_RATES[f][e] for e in engine] for f in FUEL_CLASSES])[:, None, :]
+    customs = np.stack([s["customs_rate"], s["historic_customs_rate"]])[None, :, :]
+    per_price = landed_costs(1.0, s["cad_to_pln"], 0.0, customs, excise, s["vat_rate"])["total_costs"]
+    fixed = landed_costs(0.0, s["cad_to_pln"], s["shipping"], customs, excise, s["vat_rate"])["total_costs"]
+    per_price = per_price.reshape(-1, len(scenarios))
+    fixed = fixed.reshape(-1, len(scenarios))
+
+    price = listings["price"].to_numpy(dtype=np.float64)
+    polish = listings["avg_polish_price"].to_numpy(dtype=np.float64)
+    age = datetime.datetime.now().year - pd.to_numeric(listings["year"], errors="coerce").to_numpy(dtype=np.float64)
+    historic = age >= HISTORIC_AGE  # NaN age compares False
+    duty_class = fuel_class(listings["fuelType"]) * 2 + historic
+
+    block = max(1, BLOCK_ELEMENTS // max(len(scenarios), 1))
+    stats = np.empty((len(listings), len(PERCENTILES) + 3))
+    for start in range(0, len(listings), block):
+        rows = slice(start, start + block)
+        cls = duty_class[rows]
+        profit = polish[rows, None] - fixed[cls]
+        profit -= price[rows, None] * per_price[cls]
+
+        stats[rows, :len(PERCENTILES)] = np.percentile(profit, PERCENTILES, axis=1).T
+        stats[rows, -3] = profit.min(axis=1)
+        stats[rows, -2] = profit.max(axis=1)
+        stats[rows, -1] = (profit > 0).mean(axis=1)
+
+    result = pd.DataFrame(
+        stats, index=listings.index,
+        columns=[f"profit_p{p}" for p in PERCENTILES] + ["profit_min", "profit_max", "share_profitable"],
+    )
+    return pd.concat([listings[["id", "make", "model", "year", "price"]], result.round(4)], axis=1)
+
+
+def parse_axis(values):
+    """Axis values from the command line: numbers, or MIN:MAX:STEPS for an even range."""
+    axis = []
+    for value in values:
+        if ":" in value:
+            low, high, steps = value.split(":")
+            axis.extend(np.linspace(float(low), float(high), int(steps)))
+        else:
+            axis.append(float(value))
+    return axis
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profit robustness of every opportunity across cost scenarios")
+    parser.add_argument("--db", default=KIJIJI_DB)
+    parser.add_argument("--fx", nargs="+", help="CAD->PLN rates, or MIN:MAX:STEPS")
+    parser.add_argument("--shipping", nargs="+", help="shipping quotes in PLN, or MIN:MAX:STEPS")
+    parser.add_argument("--customs", nargs="+", help="customs rates, or MIN:MAX:STEPS")
+    parser.add_argument("--historic-customs", nargs="+",
+                        help=f"customs rates for cars {HISTORIC_AGE}+ years old, or MIN:MAX:STEPS")
+    parser.add_argument("--vat", nargs="+", help="VAT rates")
+    parser.add_argument("--engine", nargs="+", choices=ENGINE_CLASSES, help="engine classes for excise")
+    parser.add_argument("--min-matches", type=int, default=1, help="only listings with this many comparables")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--write", action="store_true", help="store results in the opportunity_robustness table")
+    args = parser.parse_args()
+
+    grid = dict(DEFAULT_GRID)
+    for name, values in (("cad_to_pln", args.fx), ("shipping", args.shipping),
+                         ("customs_rate", args.customs), ("historic_customs_rate", args.historic_customs),
+                         ("vat_rate", args.vat)):
+        if values:
+            grid[name] = parse_axis(values)
+    if args.engine:
+        grid["engine"] = args.engine
+
+    listings = load_listings(args.db, args.min_matches)
+    scenarios = scenario_table(grid)
+
+    start = time.perf_counter()
+    result = sweep(listings, scenarios)
+    seconds = time.perf_counter() - start
+    cells = len(listings) * len(scenarios)
+    print(f"{len(listings)} listings x {len(scenarios)} scenarios in {seconds:.2f}s "
+          f"({cells / seconds if seconds else 0:,.0f} evaluations/s)")
+
+    ranked = result.sort_values(["share_profitable", "profit_p50"], ascending=False)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(ranked.head(args.top).to_string(index=False))
+
+    if args.write:
+        conn = sqlite3.connect(args.db)
+        result.to_sql("opportunity_robustness", conn, if_exists="replace", index=False)
+        conn.execute("CREATE INDEX opportunity_robustness_share ON opportunity_robustness (share_profitable DESC, profit_p50 DESC)")
+        conn.commit()
+        conn.close()
+        print(f"Wrote {len(result)} rows to opportunity_robustness")
+
+
+if __name__ == "__main__":
+    main()
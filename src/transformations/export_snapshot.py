@@ -0,0 +1,120 @@
+"""
+Export the merged Polish listings to a columnar Parquet snapshot.
+
+Writes a typed snapshot of polish_cars.db's cars table, hive-partitioned
+by make (snapshot/make=BMW/part-0.parquet, ...), with string columns
+dictionary-encoded. The trainers read it through
+algos/LightGBM_files/listing_data.py, pulling only the columns and makes
+they need instead of SELECT * through sqlite3.
+
+Each export goes to a new version directory (snapshot/v<ns>/make=.../),
+and the snapshot/CURRENT pointer file is switched to it with an atomic
+os.replace, so a reader always finds a complete snapshot. The previous
+version is kept for readers still holding it; older ones are removed.
+
+Run after MergePLdb.py (run_pipeline.py does this as export_snapshot).
+"""
+
+import os
+import shutil
+import sqlite3
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+DB_PATH = os.environ.get("POLISH_DB", r"src\db\polish_cars.db")
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", r"src\db\snapshot")
+CHUNK_SIZE = 100_000
+POINTER_FILE = "CURRENT"
+
+category = pa.dictionary(pa.int32(), pa.string())
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("make", pa.string()),
+    ("model", category),
+    ("year", pa.float32()),
+    ("mileage", pa.float64()),
+    ("price", pa.float64()),
+    ("fuelType", category),
+    ("transmission", category),
+    ("source", category),
+    ("currency", category),
+])
+
+SELECT_SQL = f"""
+    SELECT {", ".join(SCHEMA.names)}
+    FROM cars
+    WHERE make IS NOT NULL AND make != ''
+"""
+
+
+def clean_chunk(df):
+    # Spiders store numbers as text in places; coerce like the trainers do
+    for col in ("year", "mileage", "price"):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    for col in ("model", "fuelType", "transmission", "source", "currency"):
+        df[col] = df[col].astype("string")
+    return pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+
+
+def current_version(snapshot_dir):
+    """Name of the version CURRENT points to, or None before the first export."""
+    try:
+        with open(os.path.join(snapshot_dir, POINTER_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def switch_version(snapshot_dir, version):
+    """Point CURRENT at `version`, then drop everything but it and the one it replaced."""
+    previous = current_version(snapshot_dir)
+    pointer = os.path.join(snapshot_dir, POINTER_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+    for name in os.listdir(snapshot_dir):
+        if name not in (POINTER_FILE, version, previous):
+            path = os.path.join(snapshot_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+
+def export_snapshot(db_path=DB_PATH, snapshot_dir=SNAPSHOT_DIR):
+    # write_dataset pulls batches() from its own thread; only that thread uses the connection
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    stats = {"rows": 0, "makes": set()}
+
+    def batches():
+        # Streamed chunk by chunk so memory stays flat on large DBs
+        for chunk in pd.read_sql(SELECT_SQL, conn, chunksize=CHUNK_SIZE):
+            table = clean_chunk(chunk)
+            stats["rows"] += table.num_rows
+            stats["makes"].update(pc.unique(table["make"]).to_pylist())
+            yield from table.to_batches()
+
+    # Readers only follow CURRENT, so a half-written version is never seen
+    version = f"v{time.time_ns()}"
+    version_dir = os.path.join(snapshot_dir, version)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    ds.write_dataset(
+        batches(), version_dir,
+        schema=SCHEMA,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("make", pa.string())]), flavor="hive"),
+        existing_data_behavior="error",
+    )
+    conn.close()
+    switch_version(snapshot_dir, version)
+
+    print(f"Snapshot written to {version_dir}: {stats['rows']} rows, {len(stats['makes'])} make partitions")
+
+
+if __name__ == "__main__":
+    export_snapshot()
@@ -1,19 +1,14 @@
+import os
 import sqlite3
 import re
 import unicodedata
 
 # connect to your kijiji.db
-conn = sqlite3.connect(r"src\scrapers\listingScraper\kijiji.db")
+conn = sqlite3.connect(os.environ.get("KIJIJI_DB", r"src\scrapers\listingScraper\kijiji.db"))
 cur = conn.cursor()
 
-# fetch distinct models
-cur.execute("SELECT DISTINCT model FROM cars;")
-rows = cur.fetchall()
-
-models = [r[0] for r in rows if r[0]]
-
-cleaned = []
-for m in models:
+def clean_model_name(m):
+    """Return the cleaned model name, or None for junk."""
     m = m.strip()
     # remove stray punctuation/commas
     m = re.sub(r"[^\w\s\-]", "", m)
@@ -24,11 +19,24 @@ for m in models:
         m = m.title()
     # skip junk
     if not m or m.isdigit() or len(m) < 2:
+        return None
+    return m
+
+
+# fetch distinct make/model pairs
+cur.execute("SELECT DISTINCT make, model FROM cars;")
+rows = cur.fetchall()
+
+cleaned_pairs = set()
+for make, model in rows:
+    if not model:
         continue
-    cleaned.append(m)
+    m = clean_model_name(model)
+    if m:
+        cleaned_pairs.add((make or "", m))
 
 # deduplicate
-cleaned = sorted(set(cleaned))
+cleaned = sorted({m for _, m in cleaned_pairs})
 
 # preview
 print("Cleaned models count:", len(cleaned))
@@ -39,5 +47,10 @@ for m in cleaned[:50]:
 cur.execute("DROP TABLE IF EXISTS clean_models;")
 cur.execute("CREATE TABLE clean_models (model TEXT PRIMARY KEY);")
 cur.executemany("INSERT INTO clean_models (model) VALUES (?)", [(m,) for m in cleaned])
+
+# which makes each clean model was seen under, for make-blocked fuzzy matching
+cur.execute("DROP TABLE IF EXISTS clean_make_models;")
+cur.execute("CREATE TABLE clean_make_models (make TEXT, model TEXT, PRIMARY KEY (make, model));")
+cur.executemany("INSERT INTO clean_make_models (make, model) VALUES (?, ?)", sorted(cleaned_pairs))
 conn.commit()
 conn.close()
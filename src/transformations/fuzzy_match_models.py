@@ -1,18 +1,30 @@
+import hashlib
+import os
+import re
 import sqlite3
+import time
+import unicodedata
+
+import numpy as np
 import pandas as pd
-from thefuzz import process
+from rapidfuzz import fuzz, process as rf_process
+from rapidfuzz.utils import default_process
 
 # ===============================
 # 1. Load clean models from Canada
 # ===============================
 print("Loading clean models from Canada DB...")
-canada_db = r"src\db\kijiji.db"
-poland_db = r"src\db\polish_cars.db"
+canada_db = os.environ.get("KIJIJI_DB", r"src\db\kijiji.db")
+poland_db = os.environ.get("POLISH_DB", r"src\db\polish_cars.db")
 
 print("Loading clean models...")
 conn_ca = sqlite3.connect(canada_db)
 print("Connected to Canada DB.")
 df_models = pd.read_sql("SELECT model FROM clean_models;", conn_ca)
+try:
+    df_make_models = pd.read_sql("SELECT make, model FROM clean_make_models;", conn_ca)
+except Exception:
+    df_make_models = None  # older kijiji.db: no make blocking, global pool only
 conn_ca.close()
 
 clean_models = df_models['model'].tolist()
@@ -26,21 +38,242 @@ df_polish = pd.read_sql("SELECT * FROM cars;", conn_pl)
 # ===============================
 # 3. Fuzzy match Polish models to Canada clean models
 # ===============================
-def match_model(polish_model, choices, threshold=80):
-    """Return best match from choices if score >= threshold, else None"""
-    if not polish_model or polish_model.strip() == "":
-        return None
-    result = process.extractOne(polish_model, choices)
-    if not result:
-        return None
-    match, score = result[0], result[1]  # take only first two elements
-    if score >= threshold:
-        return match
-    return None
+# Same scoring as the thefuzz extractOne matcher this replaced: WRatio on
+# full_process(force_ascii=True) strings, the first choice with the best
+# score wins, and that score is rounded to an int
+NON_ASCII = {i: None for i in range(128, 256)}
+CDIST_CHUNK = 2000  # query rows per similarity matrix block
+
+
+def FULL_PROCESS(s):
+    # thefuzz.utils.full_process(s, force_ascii=True)
+    return default_process(str(s).translate(NON_ASCII))
+
+
+def first_best(scores):
+    """(index, rounded score) of the first best raw score along the last axis."""
+    best = scores.argmax(axis=-1)
+    best_scores = np.take_along_axis(scores, np.expand_dims(best, -1), -1).squeeze(-1)
+    return best, np.rint(best_scores).astype(int)
+
+
+def normalize_make(make):
+    """Blocking key for a make: ASCII, lowercase, punctuation folded to spaces."""
+    if not isinstance(make, str):
+        return ""
+    make = unicodedata.normalize("NFKD", make).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", make).split())
+
+
+def trigrams(processed):
+    padded = f"  {processed} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MakeBlockIndex:
+    """
+    Candidate index for fuzzy model matching.
+
+    Clean models are grouped by normalized make (with the make's first word
+    as a second key, so "Mercedes" finds the "mercedes benz" block), and each
+    block has a character-trigram index. A lookup only scores models from its
+    make's block that share a trigram with the query; rows without a known
+    make fall back to the global pool.
+    """
+
+    PREFILTER_MIN = 30  # smaller blocks are scored in full
+
+    def __init__(self, clean_models, make_models=None):
+        self.global_choices = list(clean_models)
+        order = {m: i for i, m in enumerate(self.global_choices)}
+        blocks = {}
+        for make, model in (make_models or []):
+            if model not in order:
+                continue
+            key = normalize_make(make)
+            for k in {key, key.split(" ")[0] if key else ""} - {""}:
+                blocks.setdefault(k, set()).add(model)
+        # Keep clean_models order inside a block so ties resolve like extractOne
+        self.blocks = {k: sorted(v, key=order.get) for k, v in blocks.items()}
+        self.processed = {m: FULL_PROCESS(m) for m in self.global_choices}
+        self.grams = {}
+
+    def block_key(self, make):
+        key = normalize_make(make)
+        if key in self.blocks:
+            return key
+        first = key.split(" ")[0] if key else ""
+        return first if first in self.blocks else ""
+
+    def candidates(self, key, processed_query):
+        choices = self.blocks[key]
+        if len(choices) < self.PREFILTER_MIN:
+            return choices
+        if key not in self.grams:
+            index = {}
+            for i, m in enumerate(choices):
+                for g in trigrams(self.processed[m]):
+                    index.setdefault(g, set()).add(i)
+            self.grams[key] = index
+        hits = set()
+        for g in trigrams(processed_query):
+            hits |= self.grams[key].get(g, set())
+        return [choices[i] for i in sorted(hits)]
+
+    def fingerprints(self):
+        """{block key: hash of its choices}; "" is the global pool."""
+        def digest(choices):
+            return hashlib.sha1("\n".join(choices).encode("utf-8")).hexdigest()
+
+        return {"": digest(self.global_choices), **{k: digest(v) for k, v in self.blocks.items()}}
+
+
+def load_match_cache(conn, fingerprints):
+    """
+    Cached best matches: {(block, polish model): (match, score)}. Each row
+    carries the hash of its block's choices, so a crawl that changes one
+    make's models only invalidates that make's block.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS model_match_cache (
+            block TEXT,
+            polish_model TEXT,
+            clean_model TEXT,
+            score INTEGER,
+            choices_hash TEXT,
+            PRIMARY KEY (block, polish_model)
+        )
+    """)
+    stale = [
+        (block, choices_hash)
+        for block, choices_hash in conn.execute("SELECT DISTINCT block, choices_hash FROM model_match_cache")
+        if fingerprints.get(block) != choices_hash
+    ]
+    conn.executemany("DELETE FROM model_match_cache WHERE block = ? AND choices_hash = ?", stale)
+    conn.commit()
+    if stale:
+        print(f"Invalidated cached matches of {len(stale)} changed block(s)")
+    rows = conn.execute("SELECT block, polish_model, clean_model, score FROM model_match_cache")
+    return {(block, model): (match, score) for block, model, match, score in rows}
+
+
+def save_match_cache(conn, fingerprints, matches):
+    conn.executemany(
+        "INSERT OR REPLACE INTO model_match_cache VALUES (?, ?, ?, ?, ?)",
+        [(block, model, match, score, fingerprints[block]) for (block, model), (match, score) in matches.items()],
+    )
+    conn.commit()
+
+
+def best_matches(queries, choices, workers=-1):
+    """
+    Score every query against every choice with rapidfuzz.process.cdist
+    (multi-threaded) and return {query: (best choice, rounded score)}.
+    Ties on the rounded score go to the first choice.
+    """
+    matches = {}
+    processed_choices = [FULL_PROCESS(c) for c in choices]
+    for start in range(0, len(queries), CDIST_CHUNK):
+        block = queries[start:start + CDIST_CHUNK]
+        scores = rf_process.cdist(
+            [FULL_PROCESS(q) for q in block], processed_choices,
+            scorer=fuzz.WRatio, dtype=np.float64, workers=workers,
+        )
+        best, best_scores = first_best(scores)
+        for query, idx, score in zip(block, best, best_scores):
+            matches[query] = (choices[idx], int(score))
+    return matches
+
+
+def best_blocked_matches(queries, key, index, workers=-1):
+    """
+    Best match for each query among its prefiltered candidates in block `key`.
+
+    Queries are scored in chunks with one cdist call against the union of
+    the chunk's candidates; scores of choices outside a query's own
+    candidates are masked to -1 before picking the best.
+    """
+    matches = {}
+    sizes = []
+    choices = index.blocks[key]
+    position = {m: i for i, m in enumerate(choices)}
+    for start in range(0, len(queries), CDIST_CHUNK):
+        block = queries[start:start + CDIST_CHUNK]
+        processed = [FULL_PROCESS(q) for q in block]
+        cand_positions = [[position[c] for c in index.candidates(key, p)] for p in processed]
+        sizes += [len(c) for c in cand_positions]
+
+        # Union in block order, so ties still go to the first choice
+        union = sorted({i for cands in cand_positions for i in cands})
+        column = {i: j for j, i in enumerate(union)}
+        if not union:
+            matches.update({q: (None, 0) for q in block})
+            continue
+        mask = np.zeros((len(block), len(union)), dtype=bool)
+        for row, cands in enumerate(cand_positions):
+            mask[row, [column[i] for i in cands]] = True
+
+        scores = rf_process.cdist(
+            processed, [index.processed[choices[i]] for i in union],
+            scorer=fuzz.WRatio, dtype=np.float64, workers=workers,
+        )
+        scores[~mask] = -1
+        best, best_scores = first_best(scores)
+        for query, cands, idx, score in zip(block, cand_positions, best, best_scores):
+            matches[query] = (choices[union[idx]], int(score)) if cands else (None, 0)
+    return matches, sizes
+
+
+def match_models_batch(df, index, conn, threshold=80):
+    """
+    Vectorized, make-blocked equivalent of matching each row's model with
+    thefuzz's extractOne (threshold 80):
+    each distinct (make block, model) pair is scored once, only pairs missing
+    from the cache are scored, and rows without a known make use the global pool.
+    """
+    fingerprints = index.fingerprints()
+    cache = load_match_cache(conn, fingerprints)
+
+    keys = df['make'].map(index.block_key)
+    valid = df['model'].map(lambda m: isinstance(m, str) and m.strip() != "")
+    pairs = pd.DataFrame({"block": keys[valid], "model": df['model'][valid]}).drop_duplicates()
+    new = pairs[[(b, m) not in cache for b, m in zip(pairs['block'], pairs['model'])]]
+    print(f"{len(pairs)} distinct (make, model) pairs, {len(pairs) - len(new)} cached, scoring {len(new)}...")
+
+    start = time.perf_counter()
+    scored, sizes = {}, []
+    for key, group in new.groupby("block"):
+        queries = group['model'].tolist()
+        if key == "":
+            if index.global_choices:
+                scored.update({("", q): r for q, r in best_matches(queries, index.global_choices).items()})
+                sizes += [len(index.global_choices)] * len(queries)
+        else:
+            block_scores, block_sizes = best_blocked_matches(queries, key, index)
+            scored.update({(key, q): r for q, r in block_scores.items()})
+            sizes += block_sizes
+    elapsed = time.perf_counter() - start
+
+    if scored:
+        save_match_cache(conn, fingerprints, scored)
+        cache.update(scored)
+        sizes = np.array(sizes)
+        print(
+            f"Scored {len(scored)} pairs in {elapsed:.2f}s ({len(scored) / max(elapsed, 1e-9):,.0f} pairs/s); "
+            f"candidates per lookup: mean {sizes.mean():.1f}, median {np.median(sizes):.0f}, "
+            f"max {sizes.max()} (global pool {len(index.global_choices)})"
+        )
+
+    lookup = {k: match for k, (match, score) in cache.items() if match is not None and score >= threshold}
+    return pd.Series([lookup.get((b, m)) for b, m in zip(keys, df['model'])], index=df.index)
 
 
 # Apply fuzzy matching
-df_polish['matched_model'] = df_polish['model'].apply(lambda x: match_model(x, clean_models))
+index = MakeBlockIndex(
+    clean_models,
+    df_make_models.itertuples(index=False) if df_make_models is not None else None,
+)
+df_polish['matched_model'] = match_models_batch(df_polish, index, conn_pl)
 
 # Drop rows that didn't match any clean model
 df_filtered = df_polish[df_polish['matched_model'].notnull()].copy()
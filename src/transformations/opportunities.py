@@ -0,0 +1,200 @@
+"""
+Materialized arbitrage opportunities.
+
+Computes the dashboard's ProfitCalculation (src/types/car.ts) for every
+Kijiji listing at once and stores it in kijiji.db's opportunities table,
+indexed for ranked top-N reads by /api/opportunities:
+
+    kijiji_price_pln = price (CAD) * CAD_TO_PLN
+    customs          = customs_rate * (kijiji_price_pln + shipping)
+    excise           = excise_rate * kijiji_price_pln
+    vat              = vat_rate * (kijiji_price_pln + shipping + customs + excise)
+    total_costs      = kijiji_price_pln + shipping + customs + excise + vat
+    profit           = avg_polish_price - total_costs
+
+with the KijijiCarsList.tsx defaults and avg_polish_price the mean price
+of the listing's comparables (comparables.py, whose docstring lists where
+its matching differs from the dashboard's). Listings without comparables
+get NULL Polish prices, profit and profit_pct, where the dashboard shows an
+average price of 0, a profit of -total_costs and 0 %; rank or filter on
+comparables > 0 to compare the two.
+
+The refresh is incremental: everything is recomputed in memory
+(vectorized, well under a second), then only rows whose figures changed
+are upserted, and listings gone from cars are deleted.
+
+Usage (from the repo root):
+    python src/transformations/opportunities.py
+"""
+
+import argparse
+import datetime
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from comparables import KIJIJI_DB, MILEAGE_BAND, POLISH_DB, ComparableIndex, load_kijiji, load_polish
+
+MIN_PRICE = 3000  # same floor as /api/kijiji-cars
+
+# KijijiCarsList.tsx defaults
+COSTS = {
+    "cad_to_pln": 2.62,
+    "shipping": 15000.0,
+    "customs_rate": 0.10,
+    "excise_rate": 0.186,  # engines over 2.0 L
+    "vat_rate": 0.23,
+}
+
+VALUE_COLUMNS = [
+    "make", "model", "year", "mileage", "price", "link", "comparables",
+    "kijiji_price_pln", "avg_polish_price", "median_polish_price",
+    "shipping", "customs", "excise", "vat", "total_costs", "profit", "profit_pct",
+]
+TEXT_COLUMNS = {"make", "model", "link"}
+
+CREATE_OPPORTUNITIES = """
+    CREATE TABLE IF NOT EXISTS opportunities (
+        id INTEGER PRIMARY KEY,
+        make TEXT,
+        model TEXT,
+        year INTEGER,
+        mileage REAL,
+        price REAL,
+        link TEXT,
+        comparables INTEGER,
+        kijiji_price_pln REAL,
+        avg_polish_price REAL,
+        median_polish_price REAL,
+        shipping REAL,
+        customs REAL,
+        excise REAL,
+        vat REAL,
+        total_costs REAL,
+        profit REAL,
+        profit_pct REAL,
+        updated_at TEXT
+    )
+"""
+
+CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS opportunities_profit ON opportunities (profit DESC)",
+    "CREATE INDEX IF NOT EXISTS opportunities_profit_pct ON opportunities (profit_pct DESC)",
+    "CREATE INDEX IF NOT EXISTS opportunities_make_model ON opportunities (make, model)",
+]
+
+
+def landed_costs(price_cad, cad_to_pln, shipping, customs_rate, excise_rate, vat_rate):
+    """
+    Cost breakdown in PLN. Plain NumPy arithmetic, so any argument can be an
+    array and they broadcast, e.g. listings x scenarios.
+    """
+    price_pln = price_cad * cad_to_pln
+    customs = customs_rate * (price_pln + shipping)
+    excise = excise_rate * price_pln
+    vat = vat_rate * (price_pln + shipping + customs + excise)
+    return {
+        "kijiji_price_pln": price_pln,
+        "customs": customs,
+        "excise": excise,
+        "vat": vat,
+        "total_costs": price_pln + shipping + customs + excise + vat,
+    }
+
+
+def compute_opportunities(kijiji, index, costs=COSTS, band=MILEAGE_BAND):
+    kijiji = kijiji.assign(price=pd.to_numeric(kijiji["price"], errors="coerce"))
+    kijiji = kijiji[kijiji["price"] > MIN_PRICE]
+    comps = index.match(kijiji, band)
+
+    price = kijiji["price"].to_numpy(dtype=np.float64)
+    avg = comps["mean_price"].to_numpy()
+    breakdown = landed_costs(price, **costs)
+    profit = avg - breakdown["total_costs"]
+
+    out = pd.DataFrame({
+        "id": kijiji["id"].to_numpy(),
+        "make": kijiji["make"].to_numpy(),
+        "model": kijiji["model"].to_numpy(),
+        "year": pd.to_numeric(kijiji["year"], errors="coerce").round().astype("Int64").to_numpy(),
+        "mileage": kijiji["mileage"].to_numpy(),
+        "price": price,
+        "link": kijiji["link"].to_numpy(),
+        "comparables": comps["comparables"].to_numpy(),
+        "avg_polish_price": avg,
+        "median_polish_price": comps["median_price"].to_numpy(),
+        "shipping": np.full(len(price), float(costs["shipping"])),
+        **breakdown,
+        "profit": profit,
+        "profit_pct": profit / avg * 100,
+    })
+    money = ["mileage", "kijiji_price_pln", "avg_polish_price", "median_polish_price", "shipping",
+             "customs", "excise", "vat", "total_costs", "profit", "profit_pct"]
+    out[money] = out[money].round(2)
+    return out[["id"] + VALUE_COLUMNS]
+
+
+def sql_value(value):
+    return None if pd.isna(value) else value.item() if hasattr(value, "item") else value
+
+
+def refresh_opportunities(db_path, fresh):
+    """Upsert rows of `fresh` that differ from the table and delete vanished listings."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(CREATE_OPPORTUNITIES)
+    for statement in CREATE_INDEXES:
+        conn.execute(statement)
+
+    current = pd.read_sql(f"SELECT id, {', '.join(VALUE_COLUMNS)} FROM opportunities", conn)
+    merged = fresh.merge(current, on="id", how="left", suffixes=("", "_old"), indicator=True)
+    changed = merged["_merge"] == "left_only"
+    for col in VALUE_COLUMNS:
+        new, old = merged[col], merged[f"{col}_old"]
+        if col in TEXT_COLUMNS:
+            same = new.fillna("") == old.fillna("")
+        else:
+            new, old = pd.to_numeric(new, errors="coerce"), pd.to_numeric(old, errors="coerce")
+            same = (new == old) | (new.isna() & old.isna())
+        changed |= ~same
+    upserts = merged.loc[changed, ["id"] + VALUE_COLUMNS]
+    gone = current.loc[~current["id"].isin(fresh["id"]), "id"]
+
+    updated_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    columns = ["id"] + VALUE_COLUMNS + ["updated_at"]
+    with conn:
+        conn.executemany(
+            f"""
+            INSERT INTO opportunities ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+            ON CONFLICT(id) DO UPDATE SET
+                {', '.join(f'{c} = excluded.{c}' for c in columns[1:])}
+            """,
+            [tuple(sql_value(v) for v in row) + (updated_at,) for row in upserts.itertuples(index=False)],
+        )
+        conn.executemany("DELETE FROM opportunities WHERE id = ?", [(int(i),) for i in gone])
+        conn.execute("ANALYZE opportunities")
+    conn.close()
+    return len(upserts), len(gone)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the materialized opportunities table")
+    parser.add_argument("--kijiji-db", default=KIJIJI_DB)
+    parser.add_argument("--polish-db", default=POLISH_DB)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = ComparableIndex(load_polish(args.polish_db))
+    fresh = compute_opportunities(load_kijiji(args.kijiji_db), index)
+    computed = time.perf_counter() - start
+
+    upserted, deleted = refresh_opportunities(args.kijiji_db, fresh)
+    profitable = int((fresh["profit"] > 0).sum())
+    print(f"Computed {len(fresh)} opportunities in {computed:.2f}s ({profitable} profitable); "
+          f"{upserted} rows written, {deleted} removed, {len(fresh) - upserted} unchanged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Price-history queries over a listing DB.
+
+price_history (listingScraper/migrations.py, migration 3) keeps one row
+per (listing id, epoch day) on which a listing's price changed, written by
+triggers on cars, so re-crawls that lower a price no longer lose the old
+one. Both queries below are index seeks, so they cost per recent change or
+per listing, not per stored observation:
+
+    largest_drops   listings re-priced in the last N days, ranked by how
+                    far the price fell since just before the window
+    days_on_market  days since a listing's first observation, and how
+                    often it was re-priced, for one make/model
+
+A listing stored before the history existed starts on the migration day.
+
+Usage (from the repo root):
+    python src/transformations/price_history.py drops --days 14
+    python src/transformations/price_history.py market --db src/db/polish_cars.db --make BMW --model X5
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scrapers", "listingScraper"))
+from listingScraper.migrations import HOT_QUERIES, migrate
+
+KIJIJI_DB = os.environ.get("KIJIJI_DB", r"src\db\kijiji.db")
+
+
+def epoch_day(seconds=None):
+    """Days since 1970-01-01 UTC, as stored in price_history.day."""
+    return int((time.time() if seconds is None else seconds) // 86400)
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    migrate(conn)  # creates price_history and its triggers on older DBs
+    return conn
+
+
+def largest_drops(conn, days=30, limit=50):
+    sql, _ = HOT_QUERIES["price_drops"]
+    df = pd.read_sql(sql, conn, params=[epoch_day() - days, limit])
+    df["changed_on"] = pd.to_datetime(df.pop("last_day"), unit="D").dt.date
+    return df
+
+
+def days_on_market(conn, make, model):
+    sql, _ = HOT_QUERIES["days_on_market"]
+    return pd.read_sql(sql, conn, params=[epoch_day(), make, model])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price drops and days on market from the price history")
+    parser.add_argument("--db", default=KIJIJI_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    drops = sub.add_parser("drops", help="largest recent price drops")
+    drops.add_argument("--days", type=int, default=30, help="look-back window")
+    drops.add_argument("--top", type=int, default=50)
+    market = sub.add_parser("market", help="days on market for one make/model")
+    market.add_argument("--make", required=True)
+    market.add_argument("--model", required=True)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    start = time.perf_counter()
+    if args.command == "drops":
+        result = largest_drops(conn, args.days, args.top)
+    else:
+        result = days_on_market(conn, args.make, args.model)
+    seconds = time.perf_counter() - start
+    conn.close()
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(result.to_string(index=False))
+    print(f"{len(result)} rows in {seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
+import os
 import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from utils.title_parser import parse_title
 
-DB_PATH = r"C:\Users\lukas\Documents\Car_Arbitrage\src\scrapers\listingScraper\kijiji.db"
+DB_PATH = os.environ.get("KIJIJI_DB", r"C:\Users\lukas\Documents\Car_Arbitrage\src\scrapers\listingScraper\kijiji.db")
 DEBUG_MODE = True  # toggle for manual review
+BULK_MODE = True  # chunked parsing + set-based write-back (see process_titles_bulk)
+CHUNK_SIZE = 5000
+WORKERS = 0  # >0 parses chunks in a process pool
 
 def process_titles():
     conn = sqlite3.connect(DB_PATH)
@@ -33,8 +39,8 @@ def process_titles():
                 print(f"Dropped row {row_id} (bad make: {parsed['make']})")
             continue
 
-        # Only update year if it’s currently empty
-        new_year = parsed["year"] if not current_year else current_year
+        # Only update year if it’s currently empty (year is a STRICT INTEGER column)
+        new_year = (parsed["year"] or None) if not current_year else current_year
 
         cursor.execute("""
             UPDATE cars
@@ -47,5 +53,108 @@ def process_titles():
     print("Processing complete.")
 
 
+def parse_chunk(rows):
+    """Parse (id, title, year) rows into tuples for the parsed_titles temp table."""
+    out = []
+    for row_id, title, current_year in rows:
+        parsed = parse_title(title or "")
+        # Only update year if it’s currently empty (year is a STRICT INTEGER column)
+        new_year = (parsed["year"] or None) if not current_year else current_year
+        out.append((
+            row_id, int(parsed["valid_make"]), new_year,
+            parsed["make"], parsed["model"], parsed["trim"],
+        ))
+    return out
+
+
+def iter_chunks(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def parsed_chunks(chunks, workers):
+    """Yield parsed chunks in order, keeping at most 2*workers chunks in flight."""
+    if workers <= 0:
+        for chunk in chunks:
+            yield parse_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def process_titles_bulk(db_path=DB_PATH, chunk_size=CHUNK_SIZE, workers=WORKERS):
+    """
+    Same result as process_titles(), for large DBs: rows are streamed in
+    chunks, parsed (optionally in a process pool), staged in a temp table
+    with executemany, and applied with one UPDATE ... FROM plus one
+    set-based manual-review flag (or DELETE) in a single transaction.
+    """
+    conn = sqlite3.connect(db_path)
+    read_cur = conn.cursor()
+    write_cur = conn.cursor()
+
+    write_cur.execute("""
+        CREATE TEMP TABLE parsed_titles (
+            id INTEGER PRIMARY KEY,
+            valid_make INTEGER,
+            year,
+            make TEXT,
+            model TEXT,
+            trim TEXT
+        )
+    """)
+
+    read_cur.execute("""
+        SELECT id, title, year
+        FROM cars
+        WHERE make IS NULL OR make = ''
+    """)
+
+    total = 0
+    for parsed in parsed_chunks(iter_chunks(read_cur, chunk_size), workers):
+        write_cur.executemany("INSERT INTO parsed_titles VALUES (?, ?, ?, ?, ?, ?)", parsed)
+        total += len(parsed)
+    print(f"Parsed {total} rows.")
+
+    with conn:
+        write_cur.execute("""
+            UPDATE cars
+            SET year = p.year, make = p.make, model = p.model, trim = p.trim, manual_review = 0
+            FROM parsed_titles AS p
+            WHERE cars.id = p.id AND p.valid_make = 1
+        """)
+        updated = write_cur.rowcount
+
+        if DEBUG_MODE:
+            write_cur.execute("""
+                UPDATE cars SET manual_review = 1
+                WHERE id IN (SELECT id FROM parsed_titles WHERE valid_make = 0)
+            """)
+            print(f"Updated {updated} rows, flagged {write_cur.rowcount} for review.")
+        else:
+            write_cur.execute("""
+                DELETE FROM cars
+                WHERE id IN (SELECT id FROM parsed_titles WHERE valid_make = 0)
+            """)
+            print(f"Updated {updated} rows, dropped {write_cur.rowcount} with bad makes.")
+
+    write_cur.execute("DROP TABLE parsed_titles")
+    conn.close()
+    print("Processing complete.")
+
+
 if __name__ == "__main__":
-    process_titles()
+    if BULK_MODE:
+        process_titles_bulk()
+    else:
+        process_titles()
@@ -1,4 +1,5 @@
 # transformations/normalize_fields.py
+import os
 import sqlite3
 
 # Fuel mappings
@@ -23,28 +24,64 @@ TRANSMISSION_MAP = {
     "automatic": "automatic"
 }
 
-def normalize_table(db_path: str):
+# Column -> mapping applied by normalize_table; add new mapped columns here
+COLUMN_MAPS = {
+    "fuelType": FUEL_MAP,
+    "transmission": TRANSMISSION_MAP,
+}
+
+
+def norm_key(value):
+    # Same key the mappings are looked up with (Python's lower() handles ę, ó, ...)
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+def normalize_table(db_path: str, column_maps=COLUMN_MAPS):
+    """
+    Normalize mapped columns with set-based UPDATEs in one transaction.
+
+    The mappings are loaded into a temp lookup table and joined against
+    cars through norm_key(), registered as a deterministic SQLite function.
+    Only rows whose value actually changes are written: mapped values are
+    replaced, empty strings become NULL and unmapped values are left as is.
+    """
     conn = sqlite3.connect(db_path)
+    conn.create_function("norm_key", 1, norm_key, deterministic=True)
     cur = conn.cursor()
 
-    cur.execute("SELECT id, fuelType, transmission FROM cars")
-    rows = cur.fetchall()
-
-    for row_id, fuel, trans in rows:
-        norm_fuel = FUEL_MAP.get(fuel.strip().lower(), fuel) if fuel else None
-        norm_trans = TRANSMISSION_MAP.get(trans.strip().lower(), trans) if trans else None
+    cur.execute("""
+        CREATE TEMP TABLE value_map (
+            col TEXT,
+            source TEXT,
+            target TEXT,
+            PRIMARY KEY (col, source)
+        ) WITHOUT ROWID
+    """)
+    cur.executemany(
+        "INSERT INTO value_map (col, source, target) VALUES (?, ?, ?)",
+        [(col, source, target) for col, mapping in column_maps.items() for source, target in mapping.items()],
+    )
 
-        cur.execute("""
-            UPDATE cars
-            SET fuelType = ?, transmission = ?
-            WHERE id = ?
-        """, (norm_fuel, norm_trans, row_id))
+    changed = {}
+    with conn:
+        for col in column_maps:
+            # Column names come from COLUMN_MAPS, never from data
+            cur.execute(f"""
+                UPDATE cars SET "{col}" = m.target
+                FROM value_map AS m
+                WHERE m.col = ? AND m.source = norm_key(cars."{col}")
+                  AND cars."{col}" IS NOT m.target
+            """, (col,))
+            changed[col] = cur.rowcount
+            cur.execute(f"""UPDATE cars SET "{col}" = NULL WHERE "{col}" = ''""")
+            changed[col] += cur.rowcount
 
-    conn.commit()
+    cur.execute("DROP TABLE value_map")
     conn.close()
-    print(f"Normalization complete for {db_path}")
+    summary = ", ".join(f"{col}: {n} rows" for col, n in changed.items())
+    print(f"Normalization complete for {db_path} ({summary})")
 
 if __name__ == "__main__":
     # Example usage
-    normalize_table(r"src\db\gratka.db")
-    normalize_table(r"src\db\autotrader.pl.db")
+    normalize_table(os.environ.get("GRATKA_DB", r"src\db\gratka.db"))
+    normalize_table(os.environ.get("AUTOTRADER_DB", r"src\db\autotrader.pl.db"))
@@ -0,0 +1,127 @@
+"""
+Benchmark: trie-based parse_title vs the previous linear prefix scan.
+
+Builds a title corpus (from a kijiji.db if given, otherwise synthetic titles
+from makes_models.json), checks both parsers agree on every title and
+prints titles/s for each.
+
+Usage (from src/transformations):
+    python -m utils.bench_title_parser
+    python -m utils.bench_title_parser --db path/to/kijiji.db --repeat 3
+"""
+
+import argparse
+import random
+import re
+import sqlite3
+import time
+
+from utils.title_parser import MAKES_DICT, MAKES_MODELS, SORTED_MAKES, parse_title
+
+
+def parse_title_linear(title):
+    """The original O(makes) implementation, kept here as the reference."""
+    result = {"year": "", "make": "", "model": "", "trim": "", "valid_make": False, "valid_model": False}
+    title = " ".join(title.split())
+
+    year_match = re.search(r"\b(19|20)\d{2}\b", title)
+    if year_match:
+        result["year"] = year_match.group()
+        title = title.replace(result["year"], "", 1).strip()
+
+    matched_make = None
+    for make in SORTED_MAKES:
+        if title.lower().startswith(make.lower()):
+            matched_make = make
+            break
+
+    if matched_make:
+        result["make"] = matched_make
+        result["valid_make"] = True
+        remainder = title[len(matched_make):].strip()
+    else:
+        parts = title.split()
+        result["make"] = parts[0] if parts else ""
+        remainder = " ".join(parts[1:]) if len(parts) > 1 else ""
+
+    models = MAKES_DICT.get(result["make"], [])
+    parts = remainder.split()
+    if parts:
+        matched_model = None
+        for model in sorted(models, key=lambda x: -len(x.split())):
+            if remainder.lower().startswith(model.lower()):
+                matched_model = model
+                break
+        if matched_model:
+            result["model"] = matched_model
+            result["valid_model"] = True
+            remainder = remainder[len(matched_model):].strip()
+        else:
+            result["model"] = parts[0]
+            remainder = " ".join(parts[1:])
+        if remainder:
+            result["trim"] = remainder
+    return result
+
+
+def synthetic_titles(n, seed=42):
+    rng = random.Random(seed)
+    trims = ["", "SE", "LX AWD", "Sport Touring", "4MATIC", "GT Line cuir toit", "2.0 TDI"]
+    junk = ["Wow", "Liquidation", "Camion", "!!", "Mint"]
+    titles = []
+    for _ in range(n):
+        entry = rng.choice(MAKES_MODELS)
+        models = entry.get("models") or [{"name": ""}]
+        make = entry["name"]
+        model = rng.choice(models)["name"]
+        if rng.random() < 0.3:
+            make = make.upper() if rng.random() < 0.5 else make.lower()
+        parts = [str(rng.randint(1995, 2025)), make, model, rng.choice(trims)]
+        if rng.random() < 0.1:
+            parts.insert(0, rng.choice(junk))
+        titles.append(" ".join(p for p in parts if p))
+    return titles
+
+
+def db_titles(db_path):
+    conn = sqlite3.connect(db_path)
+    titles = [t for (t,) in conn.execute("SELECT title FROM cars WHERE title IS NOT NULL")]
+    conn.close()
+    return titles
+
+
+def timed(func, titles, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for title in titles:
+            func(title)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the title parser")
+    parser.add_argument("--db", help="kijiji.db to take real titles from")
+    parser.add_argument("--size", type=int, default=50000, help="synthetic corpus size")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    titles = db_titles(args.db) if args.db else synthetic_titles(args.size)
+    print(f"Corpus: {len(titles)} titles")
+
+    # "AC" and "Acura" tie on word count; the linear scan picked either one
+    # depending on set order, the trie always takes the longer name
+    mismatches = [t for t in titles if parse_title(t) != parse_title_linear(t)]
+    print(f"Mismatches vs linear scan: {len(mismatches)}")
+    for t in mismatches[:10]:
+        print(f"  {t!r}: {parse_title_linear(t)} -> {parse_title(t)}")
+
+    linear = timed(parse_title_linear, titles, args.repeat)
+    trie = timed(parse_title, titles, args.repeat)
+    total = len(titles) * args.repeat
+    print(f"linear scan: {linear:.3f}s ({total / linear:,.0f} titles/s)")
+    print(f"trie       : {trie:.3f}s ({total / trie:,.0f} titles/s)")
+    print(f"speedup    : {linear / trie:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ import json
 import os
 
 # Load makes/models once at import time
-MAKES_JSON_PATH = os.path.join(os.path.dirname(__file__), "..\..\lookups\makes_models.json")
+MAKES_JSON_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "lookups", "makes_models.json")
 with open(MAKES_JSON_PATH, "r", encoding="utf-8") as f:
     MAKES_MODELS = json.load(f)
 
@@ -17,6 +17,51 @@ VALID_MAKES = set(MAKES_DICT.keys())
 # Sort makes by word count (longest first) so multi-word makes are matched first
 SORTED_MAKES = sorted(VALID_MAKES, key=lambda x: -len(x.split()))
 
+_END = ""  # trie key marking a complete name (real keys are single characters)
+
+
+class PrefixTrie:
+    """
+    Character trie over lowercased names. best_prefix() walks the text once
+    and returns the best-ranked name the text starts with (lowest rank wins).
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, name, rank):
+        node = self.root
+        for ch in name.lower():
+            node = node.setdefault(ch, {})
+        if _END not in node or rank < node[_END][0]:
+            node[_END] = (rank, name)
+
+    def best_prefix(self, text_lower):
+        node = self.root
+        best = node.get(_END)
+        for ch in text_lower:
+            node = node.get(ch)
+            if node is None:
+                break
+            candidate = node.get(_END)
+            if candidate is not None and (best is None or candidate[0] < best[0]):
+                best = candidate
+        return best[1] if best else None
+
+
+# Makes: most words first, as SORTED_MAKES; ties go to the longer name
+# (e.g. "Acura" over "AC" for "Acura MDX")
+MAKE_TRIE = PrefixTrie()
+for _make in VALID_MAKES:
+    MAKE_TRIE.add(_make, (-len(_make.split()), -len(_make), _make))
+
+# Models per make: most words first, ties keep the JSON order
+MODEL_TRIES = {}
+for _make, _models in MAKES_DICT.items():
+    MODEL_TRIES[_make] = PrefixTrie()
+    for _i, _model in enumerate(_models):
+        MODEL_TRIES[_make].add(_model, (-len(_model.split()), _i))
+
 
 def parse_title(title):
     """
@@ -42,11 +87,7 @@ def parse_title(title):
         title = title.replace(result["year"], "", 1).strip()
 
     # Find make by longest prefix match
-    matched_make = None
-    for make in SORTED_MAKES:
-        if title.lower().startswith(make.lower()):
-            matched_make = make
-            break
+    matched_make = MAKE_TRIE.best_prefix(title.lower())
 
     if matched_make:
         result["make"] = matched_make
@@ -59,16 +100,12 @@ def parse_title(title):
         remainder = " ".join(parts[1:]) if len(parts) > 1 else ""
 
     # Try to match model from JSON
-    models = MAKES_DICT.get(result["make"], [])
+    model_trie = MODEL_TRIES.get(result["make"])
     parts = remainder.split()
 
     if parts:
         # check longest model name match
-        matched_model = None
-        for model in sorted(models, key=lambda x: -len(x.split())):
-            if remainder.lower().startswith(model.lower()):
-                matched_model = model
-                break
+        matched_model = model_trie.best_prefix(remainder.lower()) if model_trie else None
 
         if matched_model:
             result["model"] = matched_model
@@ -88,7 +88,7 @@ app.get("/api/polish-cars/matching", (req, res) => {
 
   const query = `
     SELECT id, make, model, year, price, mileage
-    FROM polish_cars 
+    FROM cars
     WHERE make = ? AND model = ? AND year = ?
     AND (? = 0 OR (mileage BETWEEN ? AND ?))
     ORDER BY price ASC
@@ -113,6 +113,45 @@ app.get("/api/polish-cars/matching", (req, res) => {
   });
 });
 
+// Ranked arbitrage opportunities, precomputed by src/transformations/opportunities.py
+app.get("/api/opportunities", (req, res) => {
+  const limit = Math.min(parseInt(req.query.limit) || 100, 1000);
+  const minMatches = parseInt(req.query.minMatches) || 1;
+  const orderBy = req.query.sort === "margin" ? "profit_pct" : "profit";
+
+  const conditions = ["comparables >= ?"];
+  const params = [minMatches];
+  if (req.query.make) {
+    conditions.push("make = ?");
+    params.push(req.query.make);
+  }
+  if (req.query.model) {
+    conditions.push("model = ?");
+    params.push(req.query.model);
+  }
+
+  const query = `
+    SELECT id, make, model, year, price, mileage, link, comparables,
+           kijiji_price_pln AS kijijiPricePLN, avg_polish_price AS avgPolishPrice,
+           median_polish_price AS medianPolishPrice, shipping, customs, excise, vat,
+           total_costs AS totalCosts, profit, profit_pct AS profitPercentage
+    FROM opportunities
+    WHERE ${conditions.join(" AND ")}
+    ORDER BY ${orderBy} DESC
+    LIMIT ?
+  `;
+  params.push(limit);
+
+  kijijiDb.all(query, params, (err, rows) => {
+    if (err) {
+      console.error("Error fetching opportunities:", err.message);
+      res.status(500).json({ error: "Failed to fetch opportunities" });
+      return;
+    }
+    res.json(rows);
+  });
+});
+
 // Health check endpoint
 app.get("/api/health", (req, res) => {
   res.json({ status: "OK", timestamp: new Date().toISOString() });
@@ -131,6 +170,7 @@ app.listen(PORT, () => {
   console.log(
     `   GET /api/polish-cars/matching?make=BMW&model=320i&year=2018&mileage=95000`
   );
+  console.log(`   GET /api/opportunities?limit=50&sort=margin&minMatches=3`);
   console.log(`   GET /api/health`);
 });
 
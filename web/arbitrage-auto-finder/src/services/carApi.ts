@@ -1,4 +1,4 @@
-import { KijijiCar, PolishCar } from '@/types/car';
+import { KijijiCar, Opportunity, PolishCar } from '@/types/car';
 
 const API_BASE_URL = 'http://localhost:3001/api';
 
@@ -71,6 +71,35 @@ export const fetchMatchingPolishCars = async (
   }
 };
 
+// Fetch the top-ranked precomputed opportunities
+export const fetchOpportunities = async (options: {
+  limit?: number;
+  sort?: 'profit' | 'margin';
+  minMatches?: number;
+  make?: string;
+  model?: string;
+} = {}): Promise<Opportunity[]> => {
+  try {
+    const params = new URLSearchParams(
+      Object.entries(options)
+        .filter(([, value]) => value !== undefined && value !== '')
+        .map(([key, value]) => [key, String(value)])
+    );
+
+    const response = await fetch(`${API_BASE_URL}/opportunities?${params}`);
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const data = await response.json();
+    return data;
+  } catch (error) {
+    handleApiError(error, 'fetch opportunities');
+    return [];
+  }
+};
+
 // Health check to verify API connection
 export const checkApiHealth = async (): Promise<boolean> => {
   try {
@@ -27,4 +27,19 @@ export interface ProfitCalculation {
   customs: number;
   totalCosts: number;
   profit: number;
-}
\ No newline at end of file
+}
+
+// Row of the precomputed opportunities table (GET /api/opportunities)
+export interface Opportunity extends ProfitCalculation {
+  id: number;
+  make: string;
+  model: string;
+  year: number;
+  price: number; // in CAD
+  mileage: number;
+  link: string;
+  comparables: number;
+  medianPolishPrice: number | null;
+  excise: number;
+  profitPercentage: number | null;
+}